@@ -1,40 +1,183 @@
 import asyncio
-from pdf_processor import PDFProcessor
-from ai import EnglishAI
+import time
+from pdf_processor import open_book
+from ai import AsyncEnglishAI
 from notion import NotionManager
-from database import word_exists
+from database import clear_checkpoints, existing_words, get_checkpoint, init_db, save_checkpoint
+from telemetry import span, write_prometheus
+from notion_blocks import prepare_block, prepare_blocks
+from books import get_registry
+from globals import LESSON_STREAMING
 
-english_ai = EnglishAI()
-notion_manager = NotionManager()
+# Clientlar birinchi kerak bo'lganda yaratiladi, import paytida emas
+_english_ai = None
+_notion_manager = None
 
+# Bir vaqtda ishlayotgan joblar bitta so'zni Notionga ikki marta qo'shmasligi uchun
+# sync -> tekshirish -> qo'shish bitta job tomonidan bajariladi
+_vocabulary_lock = asyncio.Lock()
 
-async def start_agent(message: str):
-    """Start the agent with a lesson request"""
+
+def get_english_ai() -> AsyncEnglishAI:
+    global _english_ai
+    if _english_ai is None:
+        _english_ai = AsyncEnglishAI()
+    return _english_ai
+
+
+def get_notion_manager() -> NotionManager:
+    global _notion_manager
+    if _notion_manager is None:
+        _notion_manager = NotionManager()
+    return _notion_manager
+
+
+def startup():
+    """
+    One-time startup step: create database tables and run migrations.
+    Must be called before the first start_agent.
+    """
+    init_db()
+
+
+async def _no_progress(stage: str, detail: str):
+    pass
+
+
+async def _checkpointed(job_key: str, name: str, step):
+    """
+    Return saved result of the step, or run it (async callable) and save its result
+    """
+    result = await asyncio.to_thread(get_checkpoint, job_key, name)
+    if result is None:
+        result = await step()
+        await asyncio.to_thread(save_checkpoint, job_key, name, result)
+    else:
+        print(f"♻️ Resumed '{name}' from checkpoint")
+    return result
+
+
+async def start_agent(message: str, chat_id: str = None, progress=None, force: bool = False):
+    """
+    Start the agent with a lesson request.
+
+    Every step saves its result in vocabulary.db under the book and page range,
+    so running the same request again resumes from the first unfinished step.
+
+    Args:
+        message (str): Page range or unit, e.g. "46-63", "A1 46-63" or "A1 unit 3"
+        chat_id (str): Telegram chat that requested the lesson, used only for logs
+        progress: async callback(stage, detail) called when each stage finishes
+        force (bool): Forget saved steps and generate the range again
+    """
+    progress = progress or _no_progress
     try:
-        start_page, end_page = message.split("-")
-        print(f"🔍 Start page: {start_page}, End page: {end_page}")
+        # pipeline span ichidagi barcha span lar bitta trace_id oladi,
+        # uning log qatoridagi totals bitta unit uchun token va baytlar
+        with span("pipeline") as pipeline:
+            pipeline.set("chat_id", chat_id)
+            pipeline.set("message", message)
+            return await _run_pipeline(message, chat_id, progress, force)
+
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        raise
+    finally:
+        await asyncio.to_thread(write_prometheus)
+
 
-        pdf_processor = PDFProcessor("A1.pdf")
-        new_pdf_path = pdf_processor.extract_pages(int(start_page), int(end_page))
-        print(f"🔍 New PDF path: {new_pdf_path}")
+async def _run_pipeline(message: str, chat_id: str, progress, force: bool = False):
+    """
+    Steps of start_agent, every stage in its own telemetry span
+    """
+    # PDF ni ochish va index qurish bloklovchi ish, event loop to'xtab qolmasligi kerak
+    request = await asyncio.to_thread(get_registry().resolve, message)
+    print(
+        f"🔍 Book: {request.book}, Start page: {request.start_page}, "
+        f"End page: {request.end_page} (chat: {chat_id})"
+    )
+
+    book = await asyncio.to_thread(open_book, request.path)
+    pages = book.page_range(request.start_page, request.end_page)
+    job_key = f"{request.path}:{pages.start_page}-{pages.end_page}"
+    print(f"🔍 Pages: {pages}")
+    if force:
+        deleted = await asyncio.to_thread(clear_checkpoints, job_key)
+        print(f"♻️ Cleared {deleted} saved steps, generating again")
+    await progress("pdf", f"pages {pages.start_page}-{pages.end_page}")
+
+    lesson_page_id = await asyncio.to_thread(get_checkpoint, job_key, "done")
+    if lesson_page_id:
+        print(f"✅ Lesson already created: {lesson_page_id}")
+        await progress("lessons", "already created")
+        return lesson_page_id
+
+    english_ai = get_english_ai()
+    notion_manager = get_notion_manager()
+
+    with span("stage", stage="vocabulary"):
+        vocabulary = await _checkpointed(
+            job_key, "vocabulary", lambda: english_ai.read_vocabulary(pages)
+        )
+    print(f"🔍 Vocabulary count: {len(vocabulary)}")
+    await progress("vocabulary", f"{len(vocabulary)} words")
 
-        vocabulary = english_ai.read_pdf_and_return_new_vocabulary(new_pdf_path)
-        print(f"🔍 Vocabulary count: {len(vocabulary)}")
+    with span("stage", stage="notion_sync") as s:
+        queued_at = time.perf_counter()
+        async with _vocabulary_lock:
+            s.set("lock_wait_seconds", round(time.perf_counter() - queued_at, 3))
+            await notion_manager.get_all_words_and_update_database()
+            # yangi so'zni databasedan tekshirish kerak u yerda bo'lmasa uni notionga qo'shish kerak
+            known_words = await asyncio.to_thread(existing_words, vocabulary)
+            pushed_words = set(
+                await asyncio.to_thread(get_checkpoint, job_key, "pushed_words", [])
+            )
+            new_words = [
+                word
+                for word in vocabulary
+                if word not in known_words and word not in pushed_words
+            ]
 
-        await notion_manager.get_all_words_and_update_database()
-        # yangi so'zni databasedan tekshirish kerak u yerda bo'lmasa uni notionga qo'shish kerak
-        new_words = [word for word in vocabulary if not word_exists(word.capitalize())]
+            result = await notion_manager.add_vocabularies(
+                {word: vocabulary[word] for word in new_words}
+            )
+        pushed_words.update(word for word in new_words if word not in result["failed"])
+        await asyncio.to_thread(
+            save_checkpoint, job_key, "pushed_words", sorted(pushed_words)
+        )
+    print(f"✅ Vocabulary added successfully: {result['added']}")
+    for word, error in result["failed"].items():
+        print(f"❌ Could not add '{word}': {error}")
+    await progress(
+        "notion_sync", f"{result['added']} new words, {len(result['failed'])} failed"
+    )
 
-        for word in new_words:
-            await notion_manager.add_vocabulary(word, vocabulary[word])
-        print("✅ Vocabulary added successfully")
+    async def find_grammar():
+        if request.main_topic and request.grammar:
+            # Unit va uning grammar sarlavhalari book index da bor, model kerak emas
+            return {"main_topic": request.main_topic, "titles": request.grammar}
+        result = await english_ai.get_grammar(pages)
+        if request.main_topic:
+            result["main_topic"] = request.main_topic
+        # Topilmagan natija checkpointga yozilmaydi, qayta urinishda model yana chaqiriladi
+        if not result["main_topic"]:
+            raise ValueError(f"Main topic was not found on {pages}")
+        return result
 
-        grammar_titles = english_ai.get_grammar_from_pdf(new_pdf_path)
-        print(f"🔍 Grammar main topic: {grammar_titles['main_topic']}")
-        print(f"👨‍💻 Get new grammar titles count: {len(grammar_titles['titles'])}")
+    with span("stage", stage="grammar"):
+        grammar_titles = await _checkpointed(job_key, "grammar", find_grammar)
+    print(f"🔍 Grammar main topic: {grammar_titles['main_topic']}")
+    print(f"👨‍💻 Get new grammar titles count: {len(grammar_titles['titles'])}")
+    await progress("grammar", f"{len(grammar_titles['titles'])} titles")
 
-        lesson_page_id = await notion_manager.create_lesson_page(
-            f"{grammar_titles['main_topic']['number']}-dars. {grammar_titles['main_topic']['title']}"
+    with span("stage", stage="lessons"):
+        # sahifa bir marta yaratiladi, qayta ishga tushirilganda o'sha sahifa ishlatiladi
+        lesson_page_id = await _checkpointed(
+            job_key,
+            "lesson_page_id",
+            lambda: notion_manager.create_lesson_page(
+                f"{grammar_titles['main_topic']['number']}-dars. {grammar_titles['main_topic']['title']}"
+            ),
         )
         print(f"🔍 Created new notion page:: {lesson_page_id}")
 
@@ -42,26 +185,140 @@ async def start_agent(message: str):
         # titles = grammar_titles["titles"][:2]
         titles = grammar_titles["titles"]
 
-        content = []
-        for title in titles:
-            print(f"⚡️ Creating grammar lesson for: {title}")
-            response = english_ai.ai_create_grammar_lesson(title)
-            content.extend(response["children"])
-            # yangi titledan oldin divider qo'shish kerak
-            content.append({"object": "block", "type": "divider", "divider": {}})
+        print(f"⚡️ Creating grammar lessons for: {', '.join(titles)}")
+        await progress("lessons", f"0/{len(titles)}")
+        # Barcha darslar bir vaqtda yaratiladi, sahifaga esa tartib bilan qo'shiladi.
+        # Stream rejimida birinchi darsning bloklari tayyor bo'lishi bilan ko'rinadi.
+        lessons = []
+        try:
+            for index, title in enumerate(titles):
+                skip = await _resume_lesson(job_key, index)
+                lessons.append((_buffered(_lesson_blocks(job_key, index, title)), skip))
 
-        print(f"🔍 Content: {content}")
-        await notion_manager.update_children_in_the_page(lesson_page_id, content)
+            for index, (title, ((_, queue), skip)) in enumerate(zip(titles, lessons)):
+                await _append_lesson(job_key, lesson_page_id, index, _drain(queue, skip))
+                print(f"✅ Lesson added: {title}")
+                await progress("lessons", f"{index + 1}/{len(titles)}")
+        finally:
+            for (task, _), _ in lessons:
+                task.cancel()
 
-        print("✅ Grammar lesson created successfully")
+    await asyncio.to_thread(save_checkpoint, job_key, "done", lesson_page_id)
+    print("✅ Grammar lesson created successfully")
+    return lesson_page_id
 
-    except Exception as e:
-        print(f"❌ Error: {str(e)}")
+
+async def _resume_lesson(job_key: str, index: int) -> int:
+    """
+    Prepare lesson for a resumed run. Returns number of its blocks that are
+    already on the page. A lesson that was streamed only partly cannot be
+    continued, so its appended blocks are deleted and it is generated again.
+    """
+    appended_ids = await asyncio.to_thread(
+        get_checkpoint, job_key, f"lesson:{index}:appended_ids", []
+    )
+    lesson = await asyncio.to_thread(get_checkpoint, job_key, f"lesson:{index}")
+    if lesson is None and appended_ids:
+        print(f"♻️ Removing {len(appended_ids)} blocks of unfinished lesson {index + 1}")
+        await get_notion_manager().delete_blocks(appended_ids)
+        await asyncio.to_thread(save_checkpoint, job_key, f"lesson:{index}:appended_ids", [])
+        return 0
+    return len(appended_ids)
+
+
+async def _lesson_blocks(job_key: str, index: int, title: str):
+    """
+    Prepared Notion blocks of one lesson followed by a divider: from the
+    checkpoint, streamed from the model, or generated in one request
+    """
+    name = f"lesson:{index}"
+    lesson = await asyncio.to_thread(get_checkpoint, job_key, name)
+    if lesson is None and LESSON_STREAMING:
+        children = []
+        async for block in get_english_ai().stream_grammar_lesson(title):
+            children.append(block)
+            for prepared in prepare_block(block):
+                yield prepared
+        await asyncio.to_thread(save_checkpoint, job_key, name, {"children": children})
+    else:
+        if lesson is None:
+            lesson = await get_english_ai().create_grammar_lesson(title)
+            await asyncio.to_thread(save_checkpoint, job_key, name, lesson)
+        for prepared in prepare_blocks(lesson["children"]):
+            yield prepared
+
+    # yangi titledan oldin divider qo'shish kerak
+    yield {"object": "block", "type": "divider", "divider": {}}
+
+
+def _buffered(blocks) -> tuple:
+    """
+    Read async iterator into a queue in a background task, so all lessons
+    are generated at the same time while they are appended one by one
+
+    Returns:
+        tuple: (task, queue)
+    """
+    queue = asyncio.Queue()
+
+    async def fill():
+        try:
+            async for block in blocks:
+                queue.put_nowait(block)
+            queue.put_nowait(_END)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    return asyncio.create_task(fill()), queue
+
+
+# _buffered navbatining oxiri
+_END = object()
+
+
+async def _drain(queue: asyncio.Queue, skip: int = 0):
+    """
+    Yield blocks from a _buffered queue, skipping the first `skip` of them
+    """
+    while True:
+        item = await queue.get()
+        if item is _END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        if skip:
+            skip -= 1
+            continue
+        yield item
+
+
+async def _append_lesson(job_key: str, page_id: str, index: int, blocks):
+    """
+    Append lesson blocks while they are produced, saving ids of appended blocks
+    """
+    name = f"lesson:{index}:appended_ids"
+    appended_ids = await asyncio.to_thread(get_checkpoint, job_key, name, [])
+
+    with span("lesson.append") as s:
+        started_at = time.perf_counter()
+
+        async def on_batch(ids: list):
+            if not s.counts:
+                s.set("first_batch_seconds", round(time.perf_counter() - started_at, 3))
+            s.count("blocks", len(ids))
+            appended_ids.extend(ids)
+            await asyncio.to_thread(save_checkpoint, job_key, name, appended_ids)
+
+        await get_notion_manager().append_block_stream(page_id, blocks, on_batch=on_batch)
 
 
 async def main():
-    input_message = input("Enter the page range: ")
-    await start_agent(input_message)
+    startup()
+    input_message = input("Enter the page range or unit (e.g. 46-63, A1 unit 3): ")
+    try:
+        await start_agent(input_message)
+    except Exception:
+        pass
 
 
 if __name__ == "__main__":
@@ -1,30 +1,181 @@
 import json
+import time
 import base64
-from openai import OpenAI
-from globals import OPENAI_API_KEY
-from pdf_processor import PDFProcessor
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from globals import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MAX_CONCURRENCY,
+    VOCABULARY_CHUNK_TOKENS,
+    VOCABULARY_MAX_CANDIDATES,
+    GRAMMAR_PAGES_PER_REQUEST,
+    GRAMMAR_TEXT_PAGES_PER_REQUEST,
+)
+from pdf_processor import PageRange, RenderSettings, open_book
+from cache import ResponseCache, get_response_cache
+from database import existing_words, lookup_translations, normalize_word, save_translations
+from text_chunks import chunk_page_texts, split_long_text
+from candidate_words import assign_translations, find_candidates, format_candidates
+from grammar_detection import find_main_topic, is_reliable_text
+from telemetry import span
+from lesson_markup import MarkupParser, compile_markup
+from openai_batch import OpenAIBatch
+
+
+def as_page_range(source) -> PageRange:
+    """
+    Accept PageRange or path to PDF file (whole file is used)
+    """
+    if isinstance(source, PageRange):
+        return source
+    book = open_book(source)
+    return book.page_range(1, book.get_total_pages())
+
+
+def record_usage(current_span, response, content: str):
+    """
+    Add token usage and answer size of a chat completion response to the span
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        current_span.count("prompt_tokens", usage.prompt_tokens or 0)
+        current_span.count("completion_tokens", usage.completion_tokens or 0)
+    current_span.count("response_bytes", len((content or "").encode("utf-8")))
+    current_span.set("finish_reason", response.choices[0].finish_reason)
+
+
+def lesson_from_markup(content: str) -> dict:
+    """
+    Compile lesson markup from the model into Notion page children
+    """
+    return {"children": compile_markup(content)}
+
+
+def merge_vocabularies(parts) -> dict:
+    """
+    Merge partial vocabularies in order, dropping duplicates by normalized word.
+    The first spelling and translation of a word wins.
+    """
+    merged = {}
+    seen = set()
+    for part in parts:
+        for word, translation in part.items():
+            key = normalize_word(word)
+            if not key or key in seen or not isinstance(translation, str):
+                continue
+            seen.add(key)
+            merged[word.strip()] = translation.strip()
+    return merged
+
+
+def page_groups(items, size: int):
+    """
+    Split iterable into lists of `size` items, lazily
+    """
+    group = []
+    for item in items:
+        group.append(item)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def _is_main_topic(topic) -> bool:
+    """
+    Main topic must have numeric-only number ("2 Home", not "2A What are you?")
+    """
+    if not isinstance(topic, dict) or not str(topic.get("title") or "").strip():
+        return False
+    return str(topic.get("number", "")).strip().isdigit()
+
+
+def merge_grammar_results(results: list) -> dict:
+    """
+    Merge per-page grammar results in page order: first numeric-only main topic
+    wins and titles keep their order without duplicates.
+
+    Args:
+        results (list[tuple]): (result, response id) pairs in page order
+    """
+    main_topic = None
+    titles = []
+    seen = set()
+    for result, _ in results:
+        topic = result.get("main_topic")
+        if main_topic is None and _is_main_topic(topic):
+            main_topic = {
+                "number": int(str(topic["number"]).strip()),
+                "title": topic["title"].strip(),
+            }
+
+        for title in result.get("titles") or []:
+            if not isinstance(title, str):
+                continue
+            key = normalize_word(title)
+            if key and key not in seen:
+                seen.add(key)
+                titles.append(title.strip())
+
+    return {
+        "main_topic": main_topic,
+        "titles": titles,
+        "thread_id": results[0][1] if results else None,
+    }
 
 
 class EnglishAI:
-    def __init__(self):
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+    def __init__(self, cache: ResponseCache = None):
+        # openai paketi og'ir, faqat client kerak bo'lganda import qilinadi
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+        self.cache = cache or get_response_cache()
 
-    def read_pdf_and_return_new_vocabulary(self, pdf_path: str) -> dict:
+    def _complete(self, params: dict, parse=json.loads) -> tuple:
         """
-        PDF faylni o'qib, undan ingliz tiliga oid so'zlarni topadi va ularning o'zbekcha tarjimasi bilan qaytaradi.
+        Send chat completion request (or take it from cache) and parse the answer.
 
         Args:
-            pdf_path (str): PDF fayl yo'li
+            params (dict): Chat completion parameters
+            parse: Function that turns answer text into the result
 
         Returns:
-            dict: Inglizcha so'zlar va ularning o'zbekcha tarjimasi
+            tuple: (parsed result, response id)
+        """
+        with span("openai.chat", model=params["model"]) as s:
+            key = self.cache.make_key(params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                s.count("cache_hits")
+                return parse(cached["content"]), cached["id"]
+
+            response = self.client.chat.completions.create(**params)
+            content = response.choices[0].message.content
+            record_usage(s, response, content)
+            result = parse(content)
+            # Faqat to'liq va to'g'ri javoblarni saqlash
+            if response.choices[0].finish_reason == "stop":
+                self.cache.set(key, {"id": response.id, "content": content})
+
+            return result, response.id
+
+    def _complete_json(self, params: dict) -> tuple:
+        """
+        Send chat completion request (or take it from cache) and parse JSON answer.
+
+        Returns:
+            tuple: (parsed result, response id)
         """
-        # PDF fayldan matnni olish
-        pdf_processor = PDFProcessor(pdf_path)
-        text = pdf_processor.extract_text_from_pages(1, pdf_processor.get_total_pages())
+        return self._complete(params)
 
-        # OpenAI ga so'rov yuborish
-        response = self.client.chat.completions.create(
+    def _vocabulary_params(self, text: str) -> dict:
+        """
+        Build chat completion parameters for vocabulary extraction from one text chunk
+        """
+        return dict(
             model="gpt-3.5-turbo",
             messages=[
                 {
@@ -48,29 +199,124 @@ class EnglishAI:
             temperature=0.7,
         )
 
-        # Natijani JSON formatida qaytarish
-        return json.loads(response.choices[0].message.content)
+    def _candidate_vocabulary_params(self, candidates: str) -> dict:
+        """
+        Build chat completion parameters for translating locally found candidate words
+        """
+        return dict(
+            model="gpt-3.5-turbo",
+            messages=[
+                {
+                    "role": "system",
+                    "content": """You are a helpful assistant that builds an English vocabulary list for Uzbek learners.
+                    You get candidate words found in a text book, one per line as "word | context from the text".
+                    Your task is to:
+                    1. Keep the words that are valuable for English learners, skip names and noise
+                    2. Use the dictionary form of every word (e.g. "houses" -> "house")
+                    3. If the context shows an important phrase with the word (e.g. "get up"), use the phrase
+                    4. Provide accurate Uzbek translations that fit the context
+
+                    Return the response as a JSON with English words/phrases as keys and their Uzbek translations as values.""",
+                },
+                {
+                    "role": "user",
+                    "content": f"Please translate these candidate vocabulary words into Uzbek:\n\n{candidates}",
+                },
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.3,
+        )
 
-    def get_grammar_from_pdf(self, pdf_path: str) -> dict:
+    def _plan_vocabulary(self, pages: PageRange, max_chunk_tokens: int) -> tuple:
         """
-        Pdf file ichidagi grammar ma'lumotlarini olish va ularni qaytarish.
-        Bu function grammar titlelarini va asosiy mavzuning nomini qaytaradi.
+        Extraction step, fully local: find new candidate words, take remembered
+        translations from translation memory and build one batched translation
+        request for the rest (split only if it is over max_chunk_tokens).
+        Words already in vocabulary.db are not sent at all.
+
+        Returns:
+            tuple: (remembered {english: uzbek}, unknown candidates, request params list)
+        """
+        with span("vocabulary.prefilter") as s:
+            text = "\n\n".join(text for _, text in pages.iter_page_texts())
+            candidates = find_candidates(
+                text, known=existing_words, max_candidates=VOCABULARY_MAX_CANDIDATES
+            )
+            memory = lookup_translations(
+                [candidate.surface for candidate in candidates]
+                + [candidate.lemma for candidate in candidates]
+            )
+
+            remembered = {}
+            unknown = []
+            for candidate in candidates:
+                english, uzbek = memory.get(candidate.surface) or memory.get(candidate.lemma) or (None, None)
+                if english is None:
+                    unknown.append(candidate)
+                elif uzbek is not None:
+                    # uzbek None - model bu so'zni avval keraksiz deb tashlagan
+                    remembered[english] = uzbek
+
+            s.count("candidates", len(candidates))
+            s.count("memory_hits", len(candidates) - len(unknown))
+            requests = [
+                self._candidate_vocabulary_params(part)
+                for part in split_long_text(format_candidates(unknown), max_chunk_tokens)
+            ] if unknown else []
+            return remembered, unknown, requests
+
+    def _remember_vocabulary(self, candidates: list, translations: dict):
+        """
+        Write model answers back to translation memory in one bulk insert
+        """
+        save_translations(assign_translations(candidates, translations))
+
+    def read_pdf_and_return_new_vocabulary(
+        self, pages, max_chunk_tokens: int = VOCABULARY_CHUNK_TOKENS, prefilter: bool = True
+    ) -> dict:
+        """
+        PDF faylni o'qib, undan ingliz tiliga oid so'zlarni topadi va ularning o'zbekcha tarjimasi bilan qaytaradi.
+        Matn sahifa chegaralari bo'yicha bo'laklarga bo'linadi va bo'laklar parallel yuboriladi.
 
         Args:
-            pdf_path (str): PDF fayl yo'li
+            pages (PageRange | str): Kitob sahifalari yoki PDF fayl yo'li
+            max_chunk_tokens (int): Bitta so'rovdagi matnning taxminiy token limiti
+            prefilter (bool): Matn o'rniga lokal topilgan yangi so'zlarni yuborish,
+                vocabulary.db dagi so'zlar modelga umuman yuborilmaydi, avval
+                tarjima qilingan so'zlar translation memory dan olinadi
 
         Returns:
-            dict: {
-                'main_topic': {'number': int, 'title': str},
-                'titles': list[str],
-                'thread_id': str
-            }
+            dict: Inglizcha so'zlar va ularning o'zbekcha tarjimasi
         """
-        # PDF faylni rasmga o'tkazish
-        pdf_processor = PDFProcessor(pdf_path)
-        images = pdf_processor.convert_pdf_to_images()
+        remembered, unknown = {}, []
+        if prefilter:
+            remembered, unknown, requests = self._plan_vocabulary(
+                as_page_range(pages), max_chunk_tokens
+            )
+        else:
+            chunks = chunk_page_texts(
+                as_page_range(pages).iter_page_texts(), max_chunk_tokens
+            )
+            requests = (self._vocabulary_params(chunk) for chunk in chunks)
+
+        # Har bir bo'lak tayyor bo'lishi bilan OpenAI ga yuboriladi
+        with ThreadPoolExecutor(max_workers=OPENAI_MAX_CONCURRENCY) as executor:
+            futures = [
+                executor.submit(self._complete_json, params) for params in requests
+            ]
+            parts = [future.result()[0] for future in futures]
 
-        # OpenAI ga so'rov yuborish
+        translated = merge_vocabularies(parts)
+        if prefilter:
+            self._remember_vocabulary(unknown, translated)
+
+        # Natijani JSON formatida qaytarish
+        return merge_vocabularies([remembered, translated])
+
+    def _grammar_params(self, images, render_settings: RenderSettings) -> dict:
+        """
+        Build chat completion parameters for grammar detection from page images
+        """
         messages = [
             {
                 "role": "system",
@@ -93,7 +339,8 @@ class EnglishAI:
                     "titles": ["Present Simple", "There is/are", ...]
                 }
                 
-                Process ALL pages and combine the results into a single response.""",
+                Process ALL pages and combine the results into a single response.
+                If the main topic does not appear on the given pages, set "main_topic" to null.""",
             }
         ]
 
@@ -113,39 +360,103 @@ class EnglishAI:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,{image_base64}"
+                                "url": f"data:{render_settings.mime_type};base64,{image_base64}"
                             },
                         },
                     ],
                 }
             )
 
-        response = self.client.chat.completions.create(
+        return dict(
             model="gpt-4o",
             messages=messages,
             max_tokens=1000,
             response_format={"type": "json_object"},
         )
 
-        # Natijani JSON formatida qaytarish
-        result = json.loads(response.choices[0].message.content)
-        result["thread_id"] = response.id
+    def _grammar_text_params(self, text: str) -> dict:
+        """
+        Build cheap text-only request for grammar detection from page text layer
+        """
+        return dict(
+            model="gpt-3.5-turbo",
+            messages=[
+                {
+                    "role": "system",
+                    "content": """You are a helpful assistant that analyzes text of English learning materials and extracts grammar topics.
+                    Your task is to:
+                    1. Find the main topic number and title if it appears (e.g. "2 Home", "3 Family")
+                    2. Find ALL grammar topics/titles in the text
+                    3. Include only grammar-related titles and ignore non-grammar content
+                    4. Keep the original English titles as they appear in the text
+                    5. For main topic, only include titles with just a number (e.g. "2 Home"), ignore titles with letters (e.g. "2A What are you?")
 
-        return result
+                    Return the response as a JSON with:
+                    {
+                        "main_topic": {"number": 2, "title": "Home"},
+                        "titles": ["Present Simple", "There is/are", ...]
+                    }
+                    If the main topic does not appear in the text, set "main_topic" to null.""",
+                },
+                {
+                    "role": "user",
+                    "content": f"Please extract the main topic and all grammar titles from this text:\n\n{text}",
+                },
+            ],
+            response_format={"type": "json_object"},
+            temperature=0,
+        )
 
-    def ai_create_grammar_lesson(self, grammar_info: str) -> dict:
+    def get_grammar_from_pdf(
+        self,
+        pages,
+        render_settings: RenderSettings = None,
+        pages_per_request: int = None,
+    ) -> dict:
         """
-        Men bergan grammar ma'lumotlarini asosida yangi grammar darsini yaratish.
+        Pdf file ichidagi grammar ma'lumotlarini olish va ularni qaytarish.
+        Bu function grammar titlelarini va asosiy mavzuning nomini qaytaradi.
 
         Args:
-            grammar_info (dict): Grammar mavzu ma'lumotlari
-                - title: Grammar mavzusi nomi
-                - thread_id: Oldingi muloqot ID si
+            pages (PageRange | str): Kitob sahifalari yoki PDF fayl yo'li
+            render_settings (RenderSettings): Rasm o'lchami, DPI va formati
+            pages_per_request (int): Berilsa sahifalar shu o'lchamdagi guruhlarga
+                bo'linib parallel yuboriladi va natijalar lokal birlashtiriladi
 
         Returns:
-            dict: Notion page uchun formatda tayyorlangan dars ma'lumotlari, faqat ichida children bo'lishi kerak
+            dict: {
+                'main_topic': {'number': int, 'title': str},
+                'titles': list[str],
+                'thread_id': str
+            }
         """
-        response = self.client.chat.completions.create(
+        # PDF faylni rasmga o'tkazish
+        render_settings = render_settings or RenderSettings()
+        # Rasmlar birma-bir render qilinadi, xotirada faqat base64 nusxasi qoladi
+        images = (image for _, image in as_page_range(pages).render(render_settings))
+
+        if pages_per_request is None:
+            result, response_id = self._complete_json(
+                self._grammar_params(images, render_settings)
+            )
+            # Natijani JSON formatida qaytarish
+            result["thread_id"] = response_id
+            return result
+
+        with ThreadPoolExecutor(max_workers=OPENAI_MAX_CONCURRENCY) as executor:
+            futures = [
+                executor.submit(
+                    self._complete_json, self._grammar_params(group, render_settings)
+                )
+                for group in page_groups(images, pages_per_request)
+            ]
+            return merge_grammar_results([future.result() for future in futures])
+
+    def _grammar_lesson_params(self, grammar_info: str) -> dict:
+        """
+        Build chat completion parameters for a grammar lesson request
+        """
+        return dict(
             model="gpt-4o",
             messages=[
                 {
@@ -168,33 +479,19 @@ class EnglishAI:
                     - Make it engaging and easy to understand
                     - Use emojis for better visual organization
                     
-                    Return the response as a JSON object formatted for Notion API with these blocks:
-                    {
-                        "children": [
-                            {
-                                "object": "block",
-                                "type": "heading_1",
-                                "heading_1": {
-                                    "rich_text": [{"text": {"content": "Main Grammar Topic Title"}}]
-                                }
-                            },
-                            {
-                                "object": "block",
-                                "type": "heading_2",
-                                "heading_2": {
-                                    "rich_text": [{"text": {"content": "Section Title"}}]
-                                }
-                            },
-                            {
-                                "object": "block",
-                                "type": "paragraph",
-                                "paragraph": {
-                                    "rich_text": [{"text": {"content": "Content..."}}]
-                                }
-                            }
-                            // More blocks...
-                        ]
-                    }""",
+                    Write the lesson in this compact markup, one block per line:
+                    # Title            main title (h1), only once
+                    ## Section         section title (h2)
+                    ### Subsection     smaller title (h3)
+                    plain text         paragraph
+                    - item             bullet, indent by 2 spaces to nest
+                    1. item            numbered item
+                    > text             quote
+                    !> 💡 text         callout with an emoji
+                    + Answers          toggle, its content is indented by 2 spaces below it
+                    ---                divider
+                    Inside text use **bold**, *italic* and `code`.
+                    Return only the markup, no JSON and no ``` fences around it.""",
                 },
                 {
                     "role": "user",
@@ -202,15 +499,388 @@ class EnglishAI:
                 },
             ],
             temperature=0.7,
-            response_format={"type": "json_object"},
+        )
+
+    def ai_create_grammar_lesson(self, grammar_info: str) -> dict:
+        """
+        Men bergan grammar ma'lumotlarini asosida yangi grammar darsini yaratish.
+
+        Args:
+            grammar_info (dict): Grammar mavzu ma'lumotlari
+                - title: Grammar mavzusi nomi
+                - thread_id: Oldingi muloqot ID si
+
+        Returns:
+            dict: Notion page uchun formatda tayyorlangan dars ma'lumotlari, faqat ichida children bo'lishi kerak
+        """
+        result, response_id = self._complete(
+            self._grammar_lesson_params(grammar_info), parse=lesson_from_markup
         )
 
         # Natijani JSON formatida qaytarish
-        result = json.loads(response.choices[0].message.content)
-        result["thread_id"] = response.id
+        result["thread_id"] = response_id
+
+        return result
+
+
+class AsyncEnglishAI(EnglishAI):
+    """
+    EnglishAI variant that runs grammar lesson requests concurrently with AsyncOpenAI
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        cache: ResponseCache = None,
+    ):
+        from openai import AsyncOpenAI
+
+        super().__init__(cache=cache)
+        self.async_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _complete_async(self, params: dict, parse=json.loads) -> tuple:
+        """
+        Async version of _complete, limited by max_concurrency
+        """
+        with span("openai.chat", model=params["model"]) as s:
+            key = self.cache.make_key(params)
+            # SQLite kesh lock kutishi event loopni to'xtatmasligi kerak
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                s.count("cache_hits")
+                return parse(cached["content"]), cached["id"]
+
+            queued_at = time.perf_counter()
+            async with self.semaphore:
+                s.set("queued_seconds", round(time.perf_counter() - queued_at, 3))
+                response = await self.async_client.chat.completions.create(**params)
+
+            return await self._finish_async(s, key, response, parse)
+
+    async def _finish_async(self, s, key: str, response, parse) -> tuple:
+        """
+        Record usage, parse answer and cache it when the model finished normally
+        """
+        content = response.choices[0].message.content
+        record_usage(s, response, content)
+        result = parse(content)
+        if response.choices[0].finish_reason == "stop":
+            await asyncio.to_thread(self.cache.set, key, {"id": response.id, "content": content})
+
+        return result, response.id
+
+    async def _complete_json_async(self, params: dict) -> tuple:
+        """
+        Async version of _complete_json, limited by max_concurrency
+        """
+        return await self._complete_async(params)
+
+    async def read_vocabulary(
+        self, pages, max_chunk_tokens: int = VOCABULARY_CHUNK_TOKENS, prefilter: bool = True
+    ) -> dict:
+        """
+        Async version of read_pdf_and_return_new_vocabulary. Pages are extracted
+        in a worker thread. With prefilter all candidate requests are sent at
+        once, otherwise every text chunk is sent as soon as it is full.
+        """
+        if prefilter:
+            remembered, unknown, requests = await asyncio.to_thread(
+                self._plan_vocabulary, as_page_range(pages), max_chunk_tokens
+            )
+            results = await asyncio.gather(
+                *(self._complete_json_async(params) for params in requests)
+            )
+            translated = merge_vocabularies(result for result, _ in results)
+            await asyncio.to_thread(self._remember_vocabulary, unknown, translated)
+            return merge_vocabularies([remembered, translated])
+
+        chunks = chunk_page_texts(
+            as_page_range(pages).iter_page_texts(), max_chunk_tokens
+        )
+
+        tasks = []
+        try:
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                tasks.append(
+                    asyncio.create_task(
+                        self._complete_json_async(self._vocabulary_params(chunk))
+                    )
+                )
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        return merge_vocabularies(result for result, _ in results)
+
+    async def get_grammar(
+        self,
+        pages,
+        render_settings: RenderSettings = None,
+        pages_per_request: int = GRAMMAR_PAGES_PER_REQUEST,
+        text_first: bool = True,
+    ) -> dict:
+        """
+        Async version of get_grammar_from_pdf that always splits pages into groups.
+
+        With text_first, pages with a usable text layer are sent as text to a
+        cheap model and only pages without it are rendered and sent to gpt-4o.
+        All groups run concurrently and results are merged in page order.
+        """
+        render_settings = render_settings or RenderSettings()
+        pages = as_page_range(pages)
+
+        if text_first:
+            page_texts = await asyncio.to_thread(lambda: dict(pages.iter_page_texts()))
+        else:
+            page_texts = {}
+        text_pages = [number for number, text in page_texts.items() if is_reliable_text(text)]
+        image_pages = [number for number in pages.page_numbers if number not in text_pages]
+
+        tasks = []
+        try:
+            for group in page_groups(text_pages, GRAMMAR_TEXT_PAGES_PER_REQUEST):
+                text = "\n\n".join(page_texts[number] for number in group)
+                tasks.append(
+                    (group[0], asyncio.create_task(self._text_grammar(text)))
+                )
+
+            if image_pages:
+                print(f"🖼 Rendering pages without text layer: {image_pages}")
+                images = pages.book.render_page_numbers(image_pages, render_settings)
+                groups = page_groups(images, pages_per_request)
+                in_flight = set()
+                while True:
+                    # Bo'sh joy bo'lmasa keyingi sahifalar render qilinmaydi
+                    while len(in_flight) >= self.max_concurrency:
+                        _, in_flight = await asyncio.wait(
+                            in_flight, return_when=asyncio.FIRST_COMPLETED
+                        )
+                    group = await asyncio.to_thread(next, groups, None)
+                    if group is None:
+                        break
+                    task = asyncio.create_task(
+                        self._image_grammar([image for _, image in group], render_settings)
+                    )
+                    in_flight.add(task)
+                    tasks.append((group[0][0], task))
+
+            # Natijalar sahifa tartibida birlashtiriladi
+            tasks.sort(key=lambda item: item[0])
+            results = await asyncio.gather(*(task for _, task in tasks))
+        except BaseException:
+            for _, task in tasks:
+                task.cancel()
+            raise
+
+        return merge_grammar_results(results)
+
+    async def _image_grammar(self, images: list, render_settings: RenderSettings) -> tuple:
+        """
+        Grammar detection from rendered pages. Images are base64 encoded and
+        the cache key is built only after a request slot is free, so only
+        groups in flight are held encoded in memory.
+        """
+        queued_at = time.perf_counter()
+        async with self.semaphore:
+            params = self._grammar_params(images, render_settings)
+            with span("openai.chat", model=params["model"]) as s:
+                s.set("queued_seconds", round(time.perf_counter() - queued_at, 3))
+                key = self.cache.make_key(params)
+                cached = await asyncio.to_thread(self.cache.get, key)
+                if cached is not None:
+                    s.count("cache_hits")
+                    return json.loads(cached["content"]), cached["id"]
+                response = await self.async_client.chat.completions.create(**params)
+                return await self._finish_async(s, key, response, json.loads)
+
+    async def _text_grammar(self, text: str) -> tuple:
+        """
+        Grammar detection from text. Unit heading found by local heuristics
+        is used when the model does not return a valid main topic.
+        """
+        result, response_id = await self._complete_json_async(
+            self._grammar_text_params(text)
+        )
+        if not _is_main_topic(result.get("main_topic")):
+            result["main_topic"] = find_main_topic(text)
+        return result, response_id
+
+    async def create_grammar_lesson(self, grammar_info: str) -> dict:
+        """
+        Async version of ai_create_grammar_lesson, limited by max_concurrency
+        """
+        result, response_id = await self._complete_async(
+            self._grammar_lesson_params(grammar_info), parse=lesson_from_markup
+        )
+        result["thread_id"] = response_id
 
         return result
 
+    async def stream_grammar_lesson(self, grammar_info: str):
+        """
+        Streaming version of create_grammar_lesson. Async generator of Notion
+        blocks: every block is yielded as soon as it is complete in the model
+        output, the whole lesson is never waited for. Finished lessons are
+        cached like non-streamed ones.
+        """
+        params = self._grammar_lesson_params(grammar_info)
+        key = self.cache.make_key(params)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            for block in compile_markup(cached["content"]):
+                yield block
+            return
+
+        parser = MarkupParser()
+        # faqat keshga yozish uchun, parser o'zi faqat joriy blockni saqlaydi
+        parts = []
+        response_id = finish_reason = None
+        with span("openai.chat", model=params["model"], stream=True) as s:
+            started_at = time.perf_counter()
+            async with self.semaphore:
+                stream = await self.async_client.chat.completions.create(
+                    **params, stream=True, stream_options={"include_usage": True}
+                )
+                async for chunk in stream:
+                    response_id = chunk.id
+                    if chunk.usage is not None:
+                        s.count("prompt_tokens", chunk.usage.prompt_tokens or 0)
+                        s.count("completion_tokens", chunk.usage.completion_tokens or 0)
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    content = chunk.choices[0].delta.content
+                    if not content:
+                        continue
+                    parts.append(content)
+                    s.count("response_bytes", len(content.encode("utf-8")))
+                    for block in parser.feed(content):
+                        if "first_block_seconds" not in s.attributes:
+                            s.set("first_block_seconds", round(time.perf_counter() - started_at, 3))
+                        yield block
+
+            for block in parser.close():
+                if "first_block_seconds" not in s.attributes:
+                    s.set("first_block_seconds", round(time.perf_counter() - started_at, 3))
+                yield block
+
+            s.set("finish_reason", finish_reason)
+            if finish_reason == "stop":
+                await asyncio.to_thread(
+                    self.cache.set, key, {"id": response_id, "content": "".join(parts)}
+                )
+
+
+class BatchEnglishAI(EnglishAI):
+    """
+    EnglishAI variant for offline bulk runs. Requests are collected into a
+    JSONL file and sent through the OpenAI Batch API (about half the price
+    and a separate rate limit, answers come within the completion window).
+    Answers are written to the response cache and translation memory under
+    the same keys as interactive requests, so the normal pipeline later
+    finds them there instead of calling the model.
+    """
+
+    def __init__(self, cache: ResponseCache = None, batch: OpenAIBatch = None):
+        super().__init__(cache=cache)
+        self.batch = batch or OpenAIBatch(self.client)
+
+    def _complete_batch(self, requests: dict, parse=json.loads) -> tuple:
+        """
+        Take answers from cache, send the rest as one batch and parse them.
+
+        Args:
+            requests (dict): {custom_id: chat completion params}
+            parse: Function that turns answer text into the result
+
+        Returns:
+            tuple: ({custom_id: (parsed result, response id)}, {custom_id: error message})
+        """
+        results, pending = {}, {}
+        with span("openai.batch", requests=len(requests)) as s:
+            for custom_id, params in requests.items():
+                cached = self.cache.get(self.cache.make_key(params))
+                if cached is not None:
+                    s.count("cache_hits")
+                    results[custom_id] = parse(cached["content"]), cached["id"]
+                else:
+                    pending[custom_id] = params
+            if not pending:
+                return results, {}
+
+            responses, errors = self.batch.run(pending)
+            for custom_id, body in responses.items():
+                choice = body["choices"][0]
+                content = choice["message"]["content"]
+                try:
+                    results[custom_id] = parse(content), body["id"]
+                except ValueError as e:
+                    errors[custom_id] = f"Invalid answer: {e}"
+                    continue
+                if choice.get("finish_reason") == "stop":
+                    self.cache.set(
+                        self.cache.make_key(pending[custom_id]), {"id": body["id"], "content": content}
+                    )
+            s.count("errors", len(errors))
+            return results, errors
+
+    def ai_create_grammar_lessons(self, titles: list) -> tuple:
+        """
+        Create lessons for all titles in one batch
+
+        Returns:
+            tuple: ({title: lesson}, {title: error message})
+        """
+        titles = list(dict.fromkeys(titles))
+        results, errors = self._complete_batch(
+            {f"lesson:{index}": self._grammar_lesson_params(title) for index, title in enumerate(titles)},
+            parse=lesson_from_markup,
+        )
+        lessons, failed = {}, {}
+        for index, title in enumerate(titles):
+            custom_id = f"lesson:{index}"
+            if custom_id in results:
+                lesson, response_id = results[custom_id]
+                lessons[title] = {**lesson, "thread_id": response_id}
+            else:
+                failed[title] = errors.get(custom_id, "No result")
+        return lessons, failed
+
+    def read_vocabularies(self, page_ranges: list, max_chunk_tokens: int = VOCABULARY_CHUNK_TOKENS) -> tuple:
+        """
+        Batch version of read_pdf_and_return_new_vocabulary for many page
+        ranges. Candidates of every range are found locally, translation
+        requests of all ranges go in one batch. A range is remembered in
+        translation memory only when all its requests succeeded.
+
+        Returns:
+            tuple: ({"start-end": vocabulary}, {"start-end": error message})
+        """
+        plans = {}
+        requests = {}
+        for pages in map(as_page_range, page_ranges):
+            key = f"{pages.start_page}-{pages.end_page}"
+            plans[key] = self._plan_vocabulary(pages, max_chunk_tokens)
+            for index, params in enumerate(plans[key][2]):
+                requests[f"vocabulary:{key}:{index}"] = params
+
+        results, errors = self._complete_batch(requests)
+        vocabularies, failed = {}, {}
+        for key, (remembered, unknown, range_requests) in plans.items():
+            custom_ids = [f"vocabulary:{key}:{index}" for index in range(len(range_requests))]
+            missing = [custom_id for custom_id in custom_ids if custom_id not in results]
+            if missing:
+                failed[key] = errors.get(missing[0], "No result")
+                continue
+            translated = merge_vocabularies(results[custom_id][0] for custom_id in custom_ids)
+            self._remember_vocabulary(unknown, translated)
+            vocabularies[key] = merge_vocabularies([remembered, translated])
+        return vocabularies, failed
+
 
 # if __name__ == "__main__":
 #     # Test the class
@@ -0,0 +1,328 @@
+"""
+Process a whole book: vocabulary and grammar lessons of every unit.
+
+    python batch.py A1
+    python batch.py A1 --units 3-8 --processes 4 --concurrency 3 --json report.json
+    python batch.py A1 --openai-batch
+    python batch.py A1 --units 3 --force
+
+PDF text extraction and page rendering run in a process pool on all cores,
+units go through start_agent with bounded concurrency (OpenAI and Notion
+calls are limited further by OPENAI_MAX_CONCURRENCY and the Notion
+scheduler). Every unit is checkpointed, so running the command again only
+does what is left.
+
+With --openai-batch, vocabulary and lesson requests of all units are first
+sent through the OpenAI Batch API (cheaper, no rate limits, but answers may
+take hours); the units then run against the filled response cache.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from globals import JOB_WORKERS
+from telemetry import span
+
+# Matn chiqarish ishi processlar o'rtasida shuncha bo'lakka bo'linadi (har biriga)
+CHUNKS_PER_PROCESS = 4
+
+
+def _extract_texts(pdf_path: str, first_page: int, last_page: int) -> dict:
+    """
+    Worker process: extract text layer of the pages into the page cache
+
+    Returns:
+        dict: pages, bytes, pages without usable text and seconds spent
+    """
+    from pdf_processor import open_book
+    from grammar_detection import is_reliable_text
+
+    started_at = time.perf_counter()
+    book = open_book(pdf_path)
+    text_bytes = 0
+    unreliable = []
+    for page_number, text in book.iter_page_texts(first_page, last_page):
+        text_bytes += len(text.encode("utf-8"))
+        if not is_reliable_text(text):
+            unreliable.append(page_number)
+    return {
+        "pages": last_page - first_page + 1,
+        "bytes": text_bytes,
+        "unreliable": unreliable,
+        "seconds": time.perf_counter() - started_at,
+    }
+
+
+def _render_pages(pdf_path: str, page_numbers: list) -> dict:
+    """
+    Worker process: render pages with default settings into the page cache,
+    so grammar detection in the main process finds them there
+    """
+    from pdf_processor import RenderSettings, open_book
+
+    started_at = time.perf_counter()
+    book = open_book(pdf_path)
+    # parallellik processlar hisobidan, har biri bitta poppler thread
+    settings = RenderSettings(thread_count=1)
+    image_bytes = sum(len(image) for _, image in book.render_page_numbers(page_numbers, settings))
+    return {
+        "pages": len(page_numbers),
+        "bytes": image_bytes,
+        "seconds": time.perf_counter() - started_at,
+    }
+
+
+def page_chunks(total_pages: int, count: int) -> list:
+    """
+    Split pages 1..total_pages into at most `count` contiguous (first, last) ranges
+    """
+    size = max(1, -(-total_pages // max(1, count)))
+    return [
+        (first_page, min(total_pages, first_page + size - 1))
+        for first_page in range(1, total_pages + 1, size)
+    ]
+
+
+def plan_jobs(book: str, units: list, total_pages: int, unreliable: set, selected=None, pages_per_job: int = 10) -> list:
+    """
+    One job per unit of the book index. Books without a unit index are
+    split into pages_per_job page ranges.
+
+    Returns:
+        list[dict]: message for start_agent, pages and pages to render first
+    """
+    jobs = []
+    if units:
+        for unit in units:
+            if selected and unit.number not in selected:
+                continue
+            pages = range(unit.start_page, unit.end_page + 1)
+            jobs.append(
+                {
+                    "message": f"{book} unit {unit.number}",
+                    "pages": f"{unit.start_page}-{unit.end_page}",
+                    # grammar sarlavhalari index da bo'lsa sahifalar rasmga kerak emas
+                    "render": [] if unit.grammar else [page for page in pages if page in unreliable],
+                    "grammar": unit.grammar,
+                }
+            )
+        return jobs
+
+    for first_page in range(1, total_pages + 1, pages_per_job):
+        last_page = min(total_pages, first_page + pages_per_job - 1)
+        jobs.append(
+            {
+                "message": f"{book} {first_page}-{last_page}",
+                "pages": f"{first_page}-{last_page}",
+                "render": [page for page in range(first_page, last_page + 1) if page in unreliable],
+                "grammar": [],
+            }
+        )
+    return jobs
+
+
+def generate_with_batch_api(path: str, jobs: list) -> dict:
+    """
+    Send vocabulary requests of all jobs and lessons of grammar titles known
+    from the book index through the Batch API. Answers go to the response
+    cache and translation memory, where start_agent finds them. Lessons of
+    units without indexed grammar are generated later as usual.
+
+    Returns:
+        dict: Counts of generated and failed vocabularies and lessons
+    """
+    from ai import BatchEnglishAI
+    from pdf_processor import open_book
+
+    english_ai = BatchEnglishAI()
+    book = open_book(path)
+    page_ranges = [book.page_range(*map(int, job["pages"].split("-"))) for job in jobs]
+    vocabularies, failed_ranges = english_ai.read_vocabularies(page_ranges)
+    titles = [title for job in jobs for title in job["grammar"]]
+    lessons, failed_titles = english_ai.ai_create_grammar_lessons(titles) if titles else ({}, {})
+    for name, error in {**failed_ranges, **failed_titles}.items():
+        print(f"❌ Batch API could not process '{name}': {error}")
+    return {
+        "vocabularies": len(vocabularies),
+        "failed_vocabularies": len(failed_ranges),
+        "lessons": len(lessons),
+        "failed_lessons": len(failed_titles),
+    }
+
+
+def parse_units(value: str) -> set:
+    """
+    "3", "3-8" or "1,4,6-7" -> set of unit numbers
+    """
+    numbers = set()
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        numbers.update(range(int(first), int(last or first) + 1))
+    return numbers
+
+
+async def run_job(job: dict, render, semaphore: asyncio.Semaphore, force: bool = False) -> dict:
+    """
+    Wait for pages of the job to be rendered, then run the pipeline for it
+    """
+    from agent import start_agent
+
+    result = {"message": job["message"], "pages": job["pages"], "status": "done", "error": None}
+    stages = {}
+
+    async def progress(stage: str, detail: str):
+        stages[stage] = detail
+
+    try:
+        if render is not None:
+            await render
+        async with semaphore:
+            started_at = time.perf_counter()
+            result["lesson_page_id"] = await start_agent(job["message"], progress=progress, force=force)
+            result["seconds"] = round(time.perf_counter() - started_at, 3)
+        if stages.get("lessons") == "already created":
+            result["status"] = "skipped"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def run_batch(args) -> dict:
+    from agent import startup
+    from books import get_registry
+    from pdf_processor import open_book
+
+    startup()
+    registry = get_registry()
+    path = registry.path(args.book)
+    book = os.path.splitext(os.path.basename(path))[0]
+    total_pages = open_book(path).get_total_pages()
+    loop = asyncio.get_running_loop()
+
+    with span("batch", book=book) as batch, ProcessPoolExecutor(
+        max_workers=args.processes,
+        # fork qilingan process ota processning SQLite ulanishlarini meros qilib olardi
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        started_at = time.perf_counter()
+        extracted = await asyncio.gather(
+            *(
+                loop.run_in_executor(pool, _extract_texts, path, first_page, last_page)
+                for first_page, last_page in page_chunks(total_pages, args.processes * CHUNKS_PER_PROCESS)
+            )
+        )
+        extract_seconds = time.perf_counter() - started_at
+        unreliable = {page for chunk in extracted for page in chunk["unreliable"]}
+        print(f"📄 Extracted {total_pages} pages in {extract_seconds:.2f}s")
+
+        # Matn keshda, index qurish endi tez
+        units = await asyncio.to_thread(registry.units, book)
+        jobs = plan_jobs(
+            book,
+            units,
+            total_pages,
+            unreliable,
+            parse_units(args.units) if args.units else None,
+            args.pages_per_job,
+        )
+        print(f"📚 {book}: {len(units)} units, {len(jobs)} jobs")
+
+        openai_batch = None
+        if args.openai_batch:
+            openai_batch = await asyncio.to_thread(generate_with_batch_api, path, jobs)
+
+        # Rasmlar oldindan navbatga qo'yiladi, unitlar esa semaphore bilan ishlaydi
+        renders = [
+            loop.run_in_executor(pool, _render_pages, path, job["render"]) if job["render"] else None
+            for job in jobs
+        ]
+        semaphore = asyncio.Semaphore(args.concurrency)
+        results = await asyncio.gather(
+            *(run_job(job, render, semaphore, args.force) for job, render in zip(jobs, renders))
+        )
+        rendered = [
+            render.result()
+            for render in renders
+            if render is not None and not render.cancelled() and render.exception() is None
+        ]
+        totals = batch.totals
+
+    wall_time = time.perf_counter() - started_at
+    statuses = {status: sum(result["status"] == status for result in results) for status in ("done", "skipped", "failed")}
+    return {
+        "book": book,
+        "path": path,
+        "pages": total_pages,
+        "units": len(units),
+        "jobs": results,
+        "statuses": statuses,
+        "processes": args.processes,
+        "concurrency": args.concurrency,
+        "extract_seconds": round(extract_seconds, 3),
+        "pages_per_second": round(total_pages / extract_seconds, 1) if extract_seconds else None,
+        "rendered_pages": sum(render["pages"] for render in rendered),
+        "wall_time": round(wall_time, 3),
+        "units_per_hour": round(statuses["done"] / wall_time * 3600, 1) if wall_time else None,
+        "prompt_tokens": int(totals.get("prompt_tokens", 0)),
+        "completion_tokens": int(totals.get("completion_tokens", 0)),
+        "cache_hits": int(totals.get("cache_hits", 0)),
+        "openai_batch": openai_batch,
+    }
+
+
+def print_summary(report: dict):
+    print(f"\n📊 {report['book']} ({report['pages']} pages, {report['units']} units)")
+    for job in report["jobs"]:
+        detail = job["error"] or job.get("lesson_page_id")
+        print(f"  {job['status']:>7} {job['message']} (pages {job['pages']}): {detail}")
+    print(
+        f"\nExtraction: {report['pages']} pages in {report['extract_seconds']}s "
+        f"({report['pages_per_second']} pages/s, {report['processes']} processes), "
+        f"rendered {report['rendered_pages']} pages"
+    )
+    print(
+        f"Units: {report['statuses']['done']} done, {report['statuses']['skipped']} skipped, "
+        f"{report['statuses']['failed']} failed in {report['wall_time']}s "
+        f"({report['units_per_hour']} units/hour, concurrency {report['concurrency']})"
+    )
+    print(
+        f"OpenAI tokens: prompt={report['prompt_tokens']}, completion={report['completion_tokens']}, "
+        f"cache hits={report['cache_hits']}"
+    )
+    if report["openai_batch"]:
+        batch = report["openai_batch"]
+        print(
+            f"Batch API: {batch['vocabularies']} vocabularies ({batch['failed_vocabularies']} failed), "
+            f"{batch['lessons']} lessons ({batch['failed_lessons']} failed)"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("book", nargs="?", help="Book name, e.g. A1 (default book when omitted)")
+    parser.add_argument("--units", help='Only these units, e.g. "3-8" or "1,4"')
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="PDF worker processes")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKERS, help="Units processed at the same time")
+    parser.add_argument("--pages-per-job", type=int, default=10, help="Page range size for books without units")
+    parser.add_argument("--openai-batch", action="store_true", help="Generate through the OpenAI Batch API first")
+    parser.add_argument("--force", action="store_true", help="Forget saved steps and generate units again")
+    parser.add_argument("--json", help="Write report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run_batch(args))
+    print_summary(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2, ensure_ascii=False)
+    return 1 if report["statuses"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
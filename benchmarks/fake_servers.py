@@ -0,0 +1,484 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Soxta javoblar uchun so'zlar va grammar mavzulari
+GRAMMAR_TITLES = [
+    "Present Simple",
+    "There is / There are",
+    "Possessive adjectives",
+    "Articles a / an / the",
+    "Plural nouns",
+    "Prepositions of place",
+]
+WORD_PATTERN = re.compile(r"[A-Za-z][a-z]{3,}")
+
+
+def parse_multipart(raw: bytes, content_type: str) -> dict:
+    """
+    Fields of a multipart/form-data body: {name: bytes}
+    """
+    message = BytesParser(policy=default_policy).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + raw
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+        for part in message.iter_parts()
+    }
+
+
+class FakeServerConfig:
+    """
+    Behaviour of a fake API server
+
+    Args:
+        latency (float): Seconds added to every response
+        latency_jitter (float): Random extra latency, 0..latency_jitter seconds
+        rate_limit (float): Allowed requests per second, 0 means unlimited.
+            Requests over the limit get 429 with Retry-After.
+        error_rate (float): Share of requests (0..1) answered with a random 5xx
+        seed (int): Random seed, so runs are reproducible
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        rate_limit: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+
+class FakeServer:
+    """
+    Base class: HTTP server in a background thread with latency, rate limit,
+    error injection and request counters
+    """
+
+    def __init__(self, config: FakeServerConfig = None):
+        self.config = config or FakeServerConfig()
+        self.requests = Counter()
+        self.statuses = Counter()
+        self.lock = threading.Lock()
+        self.window_started_at = time.monotonic()
+        self.window_requests = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def route(self, method: str, path: str, body: dict):
+        """
+        Return (status, response body) for a request. Implemented by subclasses.
+        """
+        raise NotImplementedError
+
+    def _throttled(self) -> float:
+        """
+        Return Retry-After seconds if request is over the rate limit, else 0
+        """
+        if not self.config.rate_limit:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_started_at >= 1:
+                self.window_started_at = now
+                self.window_requests = 0
+            self.window_requests += 1
+            if self.window_requests > self.config.rate_limit:
+                return max(0.1, 1 - (now - self.window_started_at))
+        return 0
+
+    def _handle(self, method: str, path: str, body: dict):
+        """
+        Returns:
+            tuple: (status, response, headers, delay). Response is a dict, or a
+            list of server-sent events for streamed answers; then the delay is
+            spread between the events instead of being slept up front.
+        """
+        config = self.config
+        with self.lock:
+            self.requests[f"{method} {re.sub(r'/(?:file-|batch_)?[0-9a-f-]{32,36}', '/{id}', path)}"] += 1
+            fail = config.random.random() < config.error_rate
+            delay = config.latency + config.random.random() * config.latency_jitter
+        if not body.get("stream"):
+            time.sleep(delay)
+            delay = 0
+
+        retry_after = self._throttled()
+        if retry_after:
+            return 429, {"object": "error", "code": "rate_limited", "message": "Rate limited"}, {
+                "Retry-After": f"{retry_after:.2f}"
+            }, 0
+        if fail:
+            status = config.random.choice([500, 502, 503])
+            return status, {"object": "error", "code": "internal_server_error", "message": "Injected error"}, {}, 0
+        status, response = self.route(method, path, body)
+        return status, response, {}, delay
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("multipart/form-data"):
+                    body = parse_multipart(raw, content_type)
+                else:
+                    body = json.loads(raw) if raw else {}
+                path = self.path.split("?", 1)[0]
+                status, response, headers, delay = server._handle(self.command, path, body)
+                with server.lock:
+                    server.statuses[status] += 1
+
+                if isinstance(response, list):
+                    self._stream(response, delay)
+                    return
+
+                # bytes - fayl mazmuni (GET /v1/files/{id}/content)
+                raw_response = isinstance(response, bytes)
+                data = response if raw_response else json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if raw_response else "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, events: list, delay: float):
+                # Server-sent events, chunked: javob vaqti eventlar orasida taqsimlanadi
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in events + ["[DONE]"]:
+                    time.sleep(delay / (len(events) + 1))
+                    data = f"data: {event if isinstance(event, str) else json.dumps(event)}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeOpenAI(FakeServer):
+    """
+    Subset of OpenAI API used by EnglishAI: chat completions, files and batches.
+    Answers are chosen by looking at the system prompt.
+    """
+
+    def __init__(self, config: FakeServerConfig = None, batch_seconds: float = 0.5):
+        """
+        Args:
+            batch_seconds (float): Time after which a created batch is completed
+        """
+        super().__init__(config)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.batch_seconds = batch_seconds
+        self.files = {}
+        self.batches = {}
+
+    def route(self, method: str, path: str, body: dict):
+        if method == "POST" and path == "/v1/chat/completions":
+            return 200, self.chat_completion(body)
+        if method == "POST" and path == "/v1/files":
+            return 200, self.create_file(body["file"], body["purpose"].decode())
+        match = re.fullmatch(r"/v1/files/([\w-]+)/content", path)
+        if method == "GET" and match and match.group(1) in self.files:
+            return 200, self.files[match.group(1)]["content"]
+        if method == "POST" and path == "/v1/batches":
+            return self.create_batch(body)
+        match = re.fullmatch(r"/v1/batches/([\w-]+)", path)
+        if method == "GET" and match and match.group(1) in self.batches:
+            return 200, self.retrieve_batch(match.group(1))
+        return 404, {"error": {"message": f"Unknown endpoint {method} {path}"}}
+
+    def create_file(self, content: bytes, purpose: str, filename: str = "batch.jsonl") -> dict:
+        file = {
+            "id": f"file-{uuid.uuid4().hex}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file["id"]] = {**file, "content": content}
+        return file
+
+    def create_batch(self, body: dict):
+        if body.get("input_file_id") not in self.files:
+            return 400, {"error": {"message": "Unknown input_file_id"}}
+        lines = self.files[body["input_file_id"]]["content"].decode("utf-8").splitlines()
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex}",
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "metadata": body.get("metadata"),
+            "request_counts": {"total": len([line for line in lines if line.strip()]), "completed": 0, "failed": 0},
+        }
+        with self.lock:
+            self.batches[batch["id"]] = {**batch, "_started_at": time.monotonic()}
+        return 200, batch
+
+    def retrieve_batch(self, batch_id: str) -> dict:
+        """
+        Batch status. It is processed on the first check after batch_seconds.
+        """
+        with self.lock:
+            batch = self.batches[batch_id]
+            ready = batch["status"] == "in_progress" and time.monotonic() - batch["_started_at"] >= self.batch_seconds
+            if ready:
+                batch["status"] = "finalizing"
+        if ready:
+            self._process_batch(batch)
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    def _process_batch(self, batch: dict):
+        outputs, errors = [], []
+        for line in self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            item = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+            if request.get("url") != batch["endpoint"] or not request.get("body", {}).get("messages"):
+                errors.append({**item, "response": None, "error": {"code": "invalid_request", "message": "Invalid request"}})
+                continue
+            response = self.chat_completion(request["body"])
+            outputs.append(
+                {**item, "response": {"status_code": 200, "request_id": item["id"], "body": response}, "error": None}
+            )
+
+        def as_file(items):
+            content = "".join(json.dumps(item) + "\n" for item in items).encode("utf-8")
+            return self.create_file(content, "batch_output")["id"] if items else None
+
+        output_file_id, error_file_id = as_file(outputs), as_file(errors)
+        with self.lock:
+            batch.update(
+                status="completed",
+                output_file_id=output_file_id,
+                error_file_id=error_file_id,
+                completed_at=int(time.time()),
+                request_counts={"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)},
+            )
+
+    def answer(self, body: dict) -> str:
+        """
+        Content of the assistant message for the request
+        """
+        system = body["messages"][0]["content"]
+        user_text = " ".join(
+            part["text"] if isinstance(part, dict) and part.get("type") == "text" else str(part)
+            for message in body["messages"][1:]
+            for part in (message["content"] if isinstance(message["content"], list) else [message["content"]])
+        )
+
+        if "vocabulary" in system:
+            text = user_text.split("\n\n", 1)[-1]
+            if " | " in text:
+                # Lokal topilgan nomzodlar: "word | context"
+                words = [line.split(" | ", 1)[0].strip().lower() for line in text.splitlines() if " | " in line]
+            else:
+                words = list(dict.fromkeys(w.lower() for w in WORD_PATTERN.findall(text)))[:25]
+            return json.dumps({word: f"{word}_uz" for word in words})
+
+        if "grammar topics" in system:
+            heading = re.search(r"^\s*(\d{1,2}) ([A-Z][A-Za-z ]+?)\s*$", user_text, re.MULTILINE)
+            return json.dumps(
+                {
+                    "main_topic": {"number": int(heading.group(1)), "title": heading.group(2)} if heading else None,
+                    "titles": [title for title in GRAMMAR_TITLES if title.split()[0].lower() in user_text.lower()]
+                    or GRAMMAR_TITLES[:2],
+                }
+            )
+
+        # Grammar darsi
+        title = user_text.rsplit(":", 1)[-1].strip()
+        return self.lesson_markup(title)
+
+    @staticmethod
+    def lesson_markup(title: str) -> str:
+        lines = [f"# {title}"]
+        for section in ["Introduction", "Main Rules", "Common Usage", "Practice Exercises", "Common Mistakes"]:
+            lines.append(f"## {section}")
+            for number in range(3):
+                lines.append(f"{section} of **{title}**, example {number + 1}. " * 5)
+                lines.append("")
+            lines.append(f"- Rule of {title}")
+            lines.append(f"  - Example of {title}")
+            lines.append(f"!> 💡 Eslatma: {title}")
+        lines.append("+ Answers")
+        lines.append("  1. First answer")
+        return "\n".join(lines)
+
+    def chat_completion(self, body: dict):
+        content = self.answer(body)
+        prompt_tokens = len(json.dumps(body["messages"])) // 4
+        completion_tokens = len(content) // 4
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        if body.get("stream"):
+            return self.chat_completion_chunks(body, content, prompt_tokens, completion_tokens)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+    @staticmethod
+    def chat_completion_chunks(body: dict, content: str, prompt_tokens: int, completion_tokens: int) -> list:
+        """
+        Streamed answer: content split into ~4 token deltas, then finish_reason
+        and (with stream_options.include_usage) a usage chunk
+        """
+        response_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {"id": response_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model")}
+        chunks = [
+            {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": content[i : i + 16]}, "finish_reason": None}]}
+            for i in range(0, len(content), 16)
+        ]
+        chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if body.get("stream_options", {}).get("include_usage"):
+            chunks.append(
+                {
+                    **base,
+                    "choices": [],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }
+            )
+        return chunks
+
+
+class FakeNotion(FakeServer):
+    """
+    Subset of Notion API used by NotionManager: pages, block children and database query
+    """
+
+    def __init__(self, config: FakeServerConfig = None):
+        super().__init__(config)
+        self.pages = {}
+        self.children = {}
+
+    def route(self, method: str, path: str, body: dict):
+        parts = path.strip("/").split("/")
+        if method == "POST" and path == "/v1/pages":
+            return 200, self.create_page(body)
+        if len(parts) == 4 and parts[1] == "blocks" and parts[3] == "children":
+            if method == "PATCH":
+                if len(body.get("children", [])) > 100:
+                    return 400, {"object": "error", "code": "validation_error", "message": "Too many children"}
+                children = [{**child, "id": str(uuid.uuid4())} for child in body["children"]]
+                with self.lock:
+                    self.children.setdefault(parts[2], []).extend(children)
+                return 200, {"object": "list", "results": children}
+            if method == "GET":
+                return 200, {"object": "list", "results": self.children.get(parts[2], []), "has_more": False, "next_cursor": None}
+        if method == "DELETE" and len(parts) == 3 and parts[1] == "blocks":
+            with self.lock:
+                for children in self.children.values():
+                    children[:] = [child for child in children if child["id"] != parts[2]]
+            return 200, {"object": "block", "id": parts[2], "archived": True}
+        if method == "POST" and len(parts) == 4 and parts[1] == "databases" and parts[3] == "query":
+            return 200, self.query_database(parts[2], body)
+        return 404, {"object": "error", "code": "object_not_found", "message": f"Unknown endpoint {method} {path}"}
+
+    def create_page(self, body: dict) -> dict:
+        page = {
+            "object": "page",
+            "id": str(uuid.uuid4()),
+            "parent": body.get("parent", {}),
+            "properties": body.get("properties", {}),
+            "last_edited_time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z"),
+        }
+        with self.lock:
+            self.pages[page["id"]] = page
+        return page
+
+    def query_database(self, database_id: str, body: dict) -> dict:
+        with self.lock:
+            results = [
+                page for page in self.pages.values() if page["parent"].get("database_id") == database_id
+            ]
+        since = body.get("filter", {}).get("last_edited_time", {}).get("on_or_after")
+        if since:
+            results = [page for page in results if page["last_edited_time"] >= since]
+
+        start = int(body.get("start_cursor") or 0)
+        page_size = body.get("page_size", 100)
+        end = start + page_size
+        return {
+            "object": "list",
+            "results": results[start:end],
+            "has_more": end < len(results),
+            "next_cursor": str(end) if end < len(results) else None,
+        }
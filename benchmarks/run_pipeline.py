@@ -0,0 +1,162 @@
+"""
+Offline end-to-end benchmark of agent.start_agent.
+
+Runs the whole pipeline over a generated sample book against local fake
+OpenAI and Notion servers and reports per-stage wall time, peak RSS and
+requests issued. Nothing is sent to the real APIs.
+
+    python -m benchmarks.run_pipeline --units 3 --openai-latency 0.5 --notion-rate-limit 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_servers import FakeNotion, FakeOpenAI, FakeServerConfig  # noqa: E402
+from benchmarks.sample_pdf import make_sample_book  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--units", type=int, default=2, help="Units in the sample book")
+    parser.add_argument("--pages-per-unit", type=int, default=6)
+    parser.add_argument("--runs", type=int, default=1, help="Run every unit this many times (later runs are warm)")
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--openai-rate-limit", type=float, default=0)
+    parser.add_argument("--notion-latency", type=float, default=0.05)
+    parser.add_argument("--notion-rate-limit", type=float, default=3)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of injected 5xx answers on both servers")
+    parser.add_argument("--by-unit", action="store_true", help='Request "A1 unit N" instead of page ranges')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+class StageTimer:
+    """
+    Progress callback for start_agent that measures time spent in each stage
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.last_event_at = self.started_at
+        self.stages = {}
+
+    async def __call__(self, stage: str, detail: str):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last_event_at
+        self.last_event_at = now
+
+    @property
+    def total(self) -> float:
+        return self.last_event_at - self.started_at
+
+
+def peak_rss_mb() -> float:
+    # Linux da ru_maxrss kilobaytlarda
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_benchmark(spans: list, runs: int, by_unit: bool = False) -> list:
+    # Muhit sozlangandan keyin import qilinadi, globals.py qiymatlarni o'qiydi
+    import agent
+
+    agent.startup()
+    results = []
+    for run in range(runs):
+        for unit, (first_page, last_page) in enumerate(spans, start=1):
+            timer = StageTimer()
+            error = None
+            message = f"A1 unit {unit}" if by_unit else f"{first_page}-{last_page}"
+            try:
+                await agent.start_agent(message, progress=timer)
+            except Exception as e:
+                error = str(e)
+            results.append(
+                {
+                    "run": run + 1,
+                    "pages": f"{first_page}-{last_page}",
+                    "stages": {stage: round(seconds, 3) for stage, seconds in timer.stages.items()},
+                    "total": round(timer.total, 3),
+                    "error": error,
+                }
+            )
+    return results
+
+
+def print_report(report: dict):
+    print("\nPer-unit stage wall time (seconds)")
+    for result in report["units"]:
+        stages = ", ".join(f"{stage}={seconds}" for stage, seconds in result["stages"].items())
+        status = f" ERROR: {result['error']}" if result["error"] else ""
+        print(f"  run {result['run']} pages {result['pages']}: total={result['total']} [{stages}]{status}")
+
+    print(f"\nWall time: {report['wall_time']}s, peak RSS: {report['peak_rss_mb']:.1f} MB")
+    for service in ("openai", "notion"):
+        data = report[service]
+        print(f"\n{service} requests: {sum(data['requests'].values())}, statuses: {data['statuses']}")
+        for endpoint, count in sorted(data["requests"].items()):
+            print(f"  {endpoint}: {count}")
+    print(f"\nOpenAI tokens: prompt={report['openai']['prompt_tokens']}, completion={report['openai']['completion_tokens']}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report_path = os.path.abspath(args.json) if args.json else None
+    openai_server = FakeOpenAI(
+        FakeServerConfig(args.openai_latency, 0, args.openai_rate_limit, args.error_rate, args.seed)
+    ).start()
+    notion_server = FakeNotion(
+        FakeServerConfig(args.notion_latency, 0, args.notion_rate_limit, args.error_rate, args.seed)
+    ).start()
+
+    workdir = tempfile.mkdtemp(prefix="english-agent-bench-")
+    os.chdir(workdir)
+    spans = make_sample_book(os.path.join(workdir, "A1.pdf"), args.units, args.pages_per_unit, args.seed)
+    os.environ.update(
+        {
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"{openai_server.url}/v1",
+            "NOTION_TOKEN": "benchmark",
+            "NOTION_BASE_URL": notion_server.url,
+        }
+    )
+
+    started_at = time.perf_counter()
+    try:
+        units = asyncio.run(run_benchmark(spans, args.runs, args.by_unit))
+    finally:
+        openai_server.stop()
+        notion_server.stop()
+
+    report = {
+        "units": units,
+        "wall_time": round(time.perf_counter() - started_at, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "openai": {
+            "requests": dict(openai_server.requests),
+            "statuses": dict(openai_server.statuses),
+            "prompt_tokens": openai_server.prompt_tokens,
+            "completion_tokens": openai_server.completion_tokens,
+        },
+        "notion": {
+            "requests": dict(notion_server.requests),
+            "statuses": dict(notion_server.statuses),
+        },
+        "workdir": workdir,
+    }
+    print_report(report)
+    if report_path:
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import random
+
+UNIT_TITLES = ["Hello", "Home", "Family", "Free time", "Food", "Work", "Travel", "Weather"]
+GRAMMAR_LINES = [
+    "Grammar: Present Simple",
+    "Grammar: There is / There are",
+    "Grammar: Possessive adjectives",
+    "Grammar: Articles a / an / the",
+    "Grammar: Plural nouns",
+    "Grammar: Prepositions of place",
+]
+WORDS = (
+    "house kitchen bedroom garden window door table chair sofa carpet lamp mirror "
+    "family mother father sister brother cousin friend neighbour village city street "
+    "breakfast lunch dinner coffee bread cheese apple orange market shop office "
+    "teacher student doctor driver holiday weekend morning evening weather summer winter"
+).split()
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: list) -> bytes:
+    """
+    Build a minimal PDF with a Helvetica text layer. Every page is a list of lines.
+    """
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for index, lines in enumerate(pages):
+        page_id, content_id = 4 + index * 2, 5 + index * 2
+        kids.append(f"{page_id} 0 R")
+        stream = "BT /F1 12 Tf 60 760 Td 16 TL " + " ".join(
+            f"({_escape(line)}) '" for line in lines
+        ) + " ET"
+        objects[page_id] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    output = b"%PDF-1.4\n"
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(output)
+        output += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for number in sorted(objects):
+        output += f"{offsets[number]:010d} 00000 n \n".encode()
+    output += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return output
+
+
+def make_sample_book(path: str, units: int = 3, pages_per_unit: int = 6, seed: int = 0):
+    """
+    Write a course-book-like PDF: every unit starts with a numbered heading
+    ("2 Home") and its pages contain grammar headings and vocabulary text.
+
+    Returns:
+        list[tuple]: (first page, last page) of every unit
+    """
+    generator = random.Random(seed)
+    pages = []
+    spans = []
+    for unit in range(1, units + 1):
+        first_page = len(pages) + 1
+        for page in range(pages_per_unit):
+            lines = []
+            if page == 0:
+                lines.append(f"{unit} {UNIT_TITLES[(unit - 1) % len(UNIT_TITLES)]}")
+            lines.append(f"{unit}{'ABCDEFGH'[page % 8]} Lesson {page + 1}")
+            if page % 2 == 0:
+                lines.append(generator.choice(GRAMMAR_LINES))
+            for _ in range(30):
+                lines.append(" ".join(generator.choice(WORDS) for _ in range(10)).capitalize() + ".")
+            pages.append(lines)
+        spans.append((first_page, len(pages)))
+
+    with open(path, "wb") as pdf_file:
+        pdf_file.write(make_pdf(pages))
+    return spans
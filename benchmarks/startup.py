@@ -0,0 +1,83 @@
+"""
+Startup time benchmark.
+
+Imports the entry point modules in fresh interpreters and reports the
+median import time and which heavy packages got loaded on the way.
+
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bot /start ga javob berishi uchun kerak bo'lmagan paketlar
+HEAVY_MODULES = ["openai", "notion_client", "PyPDF2", "pdf2image", "sqlalchemy"]
+
+TARGETS = {
+    "bot": "import bot",
+    "agent": "import agent",
+    "agent + startup": "import agent; agent.startup()",
+}
+
+PROBE = """
+import json, sys, time
+started_at = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started_at
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--json", help="Write report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def measure(statement: str, runs: int, workdir: str) -> dict:
+    """
+    Run statement in `runs` new interpreters and return timings
+    """
+    code = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+    samples = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=workdir, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # vocabulary.db va boshqa fayllar repoda emas, vaqtinchalik papkada yaratiladi
+    workdir = tempfile.mkdtemp(prefix="english-agent-startup-")
+    report = {name: measure(statement, args.runs, workdir) for name, statement in TARGETS.items()}
+
+    print(f"Startup time, median of {args.runs} fresh interpreters")
+    for name, result in report.items():
+        loaded = ", ".join(result["heavy_modules_loaded"]) or "-"
+        print(f"  {name:<16} {result['median_ms']:>7} ms (min {result['min_ms']} ms)  heavy: {loaded}")
+
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from pdf_processor import PDFProcessor, open_book
+from database import get_book_index, save_book_index
+from grammar_detection import find_grammar_headings, find_main_topic, parse_unit_title
+from telemetry import span
+from globals import BOOKS_DIR, DEFAULT_BOOK
+
+# Index formati o'zgarsa oshiriladi, eski indexlar qayta quriladi
+INDEX_VERSION = 2
+
+# "46-63", "A1 46-63", "A1 p46-63" (kitobdagi sahifa raqamlari), "A1 unit 3", "unit 3-4"
+REQUEST_PATTERN = re.compile(
+    r"^\s*(?:(?P<book>(?!units?\b)\S+)\s+)?"
+    r"(?:units?\s*(?P<first_unit>\d+)(?:\s*-\s*(?P<last_unit>\d+))?"
+    r"|(?P<labels>p\.?\s*)?(?P<start>\w+)\s*-\s*(?P<end>\w+))\s*$",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class Unit:
+    """
+    Numbered unit of a course book ("2 Home") and the pages it spans
+    """
+
+    number: int
+    title: str
+    start_page: int
+    end_page: int
+    # kitobda chop etilgan sahifa raqamlari (page labels)
+    start_label: str = None
+    end_label: str = None
+    grammar: list = field(default_factory=list)
+    source: str = "text"
+
+    @property
+    def main_topic(self) -> dict:
+        return {"number": self.number, "title": self.title}
+
+
+@dataclass
+class BookRequest:
+    """
+    Lesson request resolved to a book and a page range
+    """
+
+    book: str
+    path: str
+    start_page: int
+    end_page: int
+    # Index dan topilgan unitlar, oddiy sahifa oralig'ida bo'sh bo'lishi mumkin
+    units: list = field(default_factory=list)
+
+    @property
+    def main_topic(self):
+        """
+        Topic of the first unit, None when the range does not start at a unit
+        """
+        return self.units[0].main_topic if self.units else None
+
+    @property
+    def grammar(self) -> list:
+        """
+        Grammar headings of all requested units. Empty when the range does not
+        end where a unit ends: headings are kept per unit, not per page, so
+        the pages are read by the model instead.
+        """
+        if not self.units or self.units[-1].end_page != self.end_page:
+            return []
+        titles = []
+        for unit in self.units:
+            titles.extend(title for title in unit.grammar if title not in titles)
+        return titles
+
+
+def _outline_units(book: PDFProcessor) -> list:
+    """
+    (first page, number, title) of unit entries in the PDF outline (bookmarks)
+    """
+    found = []
+
+    def walk(items):
+        for item in items:
+            if isinstance(item, list):
+                walk(item)
+                continue
+            topic = parse_unit_title(item.title or "")
+            if topic is None:
+                continue
+            page_number = book.reader.get_destination_page_number(item) + 1
+            found.append((page_number, topic["number"], topic["title"]))
+
+    with book.lock:
+        try:
+            outline = book.reader.outline
+        except Exception as e:
+            # Buzilgan outline bo'lsa matn bo'yicha topiladi
+            print(f"⚠️ Could not read outline of {book.pdf_path}: {e}")
+            outline = []
+        walk(outline)
+    return sorted(found)
+
+
+def _roman(number: int) -> str:
+    numerals = [
+        (1000, "M"), (900, "CM"), (500, "D"), (400, "CD"), (100, "C"), (90, "XC"),
+        (50, "L"), (40, "XL"), (10, "X"), (9, "IX"), (5, "V"), (4, "IV"), (1, "I"),
+    ]
+    result = ""
+    for value, numeral in numerals:
+        count, number = divmod(number, value)
+        result += numeral * count
+    return result
+
+
+def _format_label(number: int, style: str) -> str:
+    """
+    Page number in a /PageLabels numbering style (PDF 1.7, 12.4.2)
+    """
+    if style == "/D":
+        return str(number)
+    if style in ("/R", "/r"):
+        numeral = _roman(number)
+        return numeral if style == "/R" else numeral.lower()
+    if style in ("/A", "/a"):
+        # 1 -> A, 26 -> Z, 27 -> AA, 53 -> AAA
+        letter = chr(ord("A") + (number - 1) % 26) * ((number - 1) // 26 + 1)
+        return letter if style == "/A" else letter.lower()
+    # uslubsiz oraliqda faqat prefix bo'ladi
+    return ""
+
+
+def _label_ranges(node) -> list:
+    """
+    (first page index, label dict) entries of the /PageLabels number tree
+    """
+    node = node.get_object()
+    if "/Nums" in node:
+        nums = node["/Nums"]
+        return [(int(nums[i]), nums[i + 1].get_object()) for i in range(0, len(nums) - 1, 2)]
+    ranges = []
+    for kid in node.get("/Kids", []):
+        ranges.extend(_label_ranges(kid))
+    return ranges
+
+
+def _page_labels(book: PDFProcessor) -> list:
+    """
+    Printed page number of every page, e.g. ["i", "ii", "1", "2", ...],
+    read from /PageLabels of the document catalog. Pages are numbered
+    1..N when the book has no labels.
+    """
+    total_pages = book.get_total_pages()
+    labels = [str(number) for number in range(1, total_pages + 1)]
+    with book.lock:
+        catalog = book.reader.trailer["/Root"]
+        if "/PageLabels" not in catalog:
+            return labels
+        try:
+            ranges = sorted(_label_ranges(catalog["/PageLabels"]), key=lambda item: item[0])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            # Buzilgan /PageLabels bo'lsa sahifalar oddiy raqamlanadi
+            print(f"⚠️ Could not read page labels of {book.pdf_path}: {e}")
+            return labels
+
+        for index, (first_page, label) in enumerate(ranges):
+            last_page = ranges[index + 1][0] if index + 1 < len(ranges) else total_pages
+            prefix = str(label.get("/P", ""))
+            style = label.get("/S")
+            start = int(label.get("/St", 1))
+            for page_index in range(max(0, first_page), min(last_page, total_pages)):
+                labels[page_index] = prefix + _format_label(start + page_index - first_page, style)
+    return labels
+
+
+def build_unit_index(book: PDFProcessor) -> list:
+    """
+    Find units of the book without any model call.
+
+    Unit start pages come from the PDF outline when it has numbered unit
+    entries, otherwise from unit headings ("2 Home") at the top of pages.
+    Headings must increase (at most one unit may be missed), so numbered
+    exercises and the contents page are not taken for units. Every unit
+    ends where the next one starts. Grammar headings are read from the
+    text layer of its pages.
+
+    Returns:
+        list[Unit]: Units in page order
+    """
+    total_pages = book.get_total_pages()
+    labels = _page_labels(book)
+    page_texts = dict(book.iter_page_texts(1, total_pages))
+
+    starts = _outline_units(book)
+    source = "outline"
+    if not starts:
+        source = "text"
+        for page_number, text in page_texts.items():
+            topic = find_main_topic(text)
+            if topic is None:
+                continue
+            previous = starts[-1][1] if starts else 0
+            if previous < topic["number"] <= previous + 2:
+                starts.append((page_number, topic["number"], topic["title"]))
+
+    units = []
+    for index, (start_page, number, title) in enumerate(starts):
+        end_page = starts[index + 1][0] - 1 if index + 1 < len(starts) else total_pages
+        end_page = max(start_page, end_page)
+        grammar = []
+        for page_number in range(start_page, end_page + 1):
+            for heading in find_grammar_headings(page_texts.get(page_number, "")):
+                if heading not in grammar:
+                    grammar.append(heading)
+        units.append(
+            Unit(
+                number,
+                title,
+                start_page,
+                end_page,
+                labels[start_page - 1] if start_page <= len(labels) else None,
+                labels[end_page - 1] if end_page <= len(labels) else None,
+                grammar,
+                source,
+            )
+        )
+    return units
+
+
+class BookRegistry:
+    """
+    PDF books that lessons can be requested from: every *.pdf in BOOKS_DIR
+    and DEFAULT_BOOK, named by file name without extension ("A1").
+    Unit index of every book is built once and kept in vocabulary.db.
+    """
+
+    def __init__(self, books_dir: str = BOOKS_DIR, default_book: str = DEFAULT_BOOK):
+        self.books_dir = books_dir
+        self.default_book = default_book
+        self._units = {}
+        self._lock = threading.Lock()
+
+    def books(self) -> dict:
+        """
+        Returns:
+            dict: {book name: pdf path}
+        """
+        paths = [self.default_book]
+        if self.books_dir and os.path.isdir(self.books_dir):
+            paths += sorted(
+                os.path.join(self.books_dir, name)
+                for name in os.listdir(self.books_dir)
+                if name.lower().endswith(".pdf")
+            )
+        books = {}
+        for path in paths:
+            books.setdefault(os.path.splitext(os.path.basename(path))[0], path)
+        return books
+
+    def path(self, name: str = None) -> str:
+        """
+        PDF path of the book, the default book when name is not given
+        """
+        if name is None:
+            return self.default_book
+        books = {book.casefold(): path for book, path in self.books().items()}
+        if name.casefold() not in books:
+            raise ValueError(f"Unknown book '{name}', available: {', '.join(self.books())}")
+        return books[name.casefold()]
+
+    def units(self, name: str = None) -> list:
+        """
+        Unit index of the book: from memory, from the database, or built now
+        """
+        path = self.path(name)
+        key = os.path.abspath(path)
+        with self._lock:
+            if key not in self._units:
+                book = open_book(path)
+                saved = get_book_index(book.content_hash, INDEX_VERSION)
+                if saved is not None:
+                    units = [Unit(**unit) for unit in saved]
+                else:
+                    with span("book.index") as s:
+                        units = build_unit_index(book)
+                        s.set("path", key)
+                        s.count("units", len(units))
+                    save_book_index(
+                        book.content_hash, key, INDEX_VERSION, [asdict(unit) for unit in units]
+                    )
+                self._units[key] = units
+            return self._units[key]
+
+    def resolve(self, message: str) -> BookRequest:
+        """
+        Turn a lesson request into a book and pages.
+
+            "46-63"       pages of the default book
+            "A1 46-63"    pages of book A1
+            "A1 p46-63"   printed page numbers (page labels) of book A1
+            "A1 unit 3"   unit 3 of book A1, "unit 3-4" for several units
+        """
+        match = REQUEST_PATTERN.match(message)
+        if not match:
+            raise ValueError(
+                f"Could not understand '{message}', use e.g. '46-63' or 'A1 unit 3'"
+            )
+
+        path = self.path(match.group("book"))
+        name = os.path.splitext(os.path.basename(path))[0]
+
+        if match.group("first_unit"):
+            first = int(match.group("first_unit"))
+            last = int(match.group("last_unit") or first)
+            units = {unit.number: unit for unit in self.units(name)}
+            missing = [number for number in (first, last) if number not in units]
+            if missing:
+                raise ValueError(
+                    f"Unit {missing[0]} was not found in {name}, units: {', '.join(map(str, sorted(units)))}"
+                )
+            return BookRequest(
+                name,
+                path,
+                units[first].start_page,
+                units[last].end_page,
+                [unit for number, unit in sorted(units.items()) if first <= number <= last],
+            )
+
+        start, end = match.group("start"), match.group("end")
+        if match.group("labels"):
+            labels = _page_labels(open_book(path))
+            if start not in labels or end not in labels:
+                raise ValueError(f"Page {start if start not in labels else end} was not found in {name}")
+            start_page, end_page = labels.index(start) + 1, labels.index(end) + 1
+        elif start.isdigit() and end.isdigit():
+            start_page, end_page = int(start), int(end)
+        else:
+            raise ValueError(f"Invalid page range '{start}-{end}'")
+
+        book_units = self.units(name)
+        if book_units:
+            # oxirgi unit kitob oxirigacha davom etadi
+            end_page = min(end_page, book_units[-1].end_page)
+        # Oraliq unit boshidan boshlansa uning nomi ham ma'lum
+        units = [
+            unit
+            for unit in book_units
+            if unit.start_page == start_page
+            or (unit.start_page > start_page and unit.end_page <= end_page)
+        ]
+        if units and units[0].start_page != start_page:
+            units = []
+        return BookRequest(name, path, start_page, end_page, units)
+
+
+_registry = None
+
+
+def get_registry() -> BookRegistry:
+    global _registry
+    if _registry is None:
+        _registry = BookRegistry()
+    return _registry
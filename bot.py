@@ -1,7 +1,35 @@
+import asyncio
 from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
-from agent import start_agent
-from globals import TELEGRAM_TOKEN
+from telegram.error import BadRequest
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, ContextTypes
+from globals import METRICS_PORT, TELEGRAM_TOKEN
+from jobs import Job, JobQueue
+from telemetry import serve_metrics
+
+
+# post_init da boshlanadigan warm_up vazifasi
+warm_up_task = None
+
+
+async def run_job(job: Job):
+    # agent (openai, PyPDF2, sqlalchemy) bot javob bera boshlagandan keyin yuklanadi
+    await warm_up_task
+    from agent import start_agent
+
+    return await start_agent(job.message, job.chat_id, progress=job.progress, force=job.force)
+
+
+def warm_up():
+    """
+    Import the pipeline and prepare the database in a worker thread,
+    so the first /add_task does not pay for it
+    """
+    from agent import startup
+
+    startup()
+
+
+job_queue = JobQueue(run_job)
 
 
 async def help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -15,15 +43,68 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def add_task(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text("Agent is starting...")
-    await start_agent(update.message.text, str(update.effective_chat.id))
+    args = list(context.args)
+    # "/add_task A1 unit 3 force" tayyor darsni qaytadan yaratadi
+    force = bool(args) and args[-1].lower() == "force"
+    if force:
+        args.pop()
+    page_range = " ".join(args)
+    if not page_range:
+        await update.message.reply_text(
+            "Usage: /add_task 46-63 or /add_task A1 unit 3 (add 'force' to generate again)"
+        )
+        return
+
+    status_message = await update.message.reply_text("🕒 Agent is starting...")
+
+    async def on_update(job: Job):
+        try:
+            await status_message.edit_text(job.render())
+        except BadRequest as e:
+            # Matn o'zgarmagan bo'lsa Telegram xato qaytaradi
+            if "not modified" not in str(e):
+                raise
+
+    job = job_queue.submit(str(update.effective_chat.id), page_range, force=force)
+    await status_message.edit_text(
+        f"{job.render()}\nJobs waiting in queue: {job_queue.pending}"
+    )
+    # Tasdiq xabaridan keyin bosqichlar shu xabarni yangilaydi
+    job.on_update = on_update
+    if job.status != "queued":
+        await job.notify()
+
+
+async def start_job_queue(application: Application) -> None:
+    global warm_up_task
+    # Bot darrov javob beradi, pipeline fonda tayyorlanadi
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    job_queue.start()
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+        print(f"📈 Metrics: http://localhost:{METRICS_PORT}/metrics")
+
+
+async def stop_job_queue(application: Application) -> None:
+    await job_queue.stop()
+
+
+def main():
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(start_job_queue)
+        .post_shutdown(stop_job_queue)
+        .build()
+    )
 
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("help", help))
+    app.add_handler(CommandHandler("add_task", add_task))
 
-app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    print("Bot is running...")
+    app.run_polling()
 
-app.add_handler(CommandHandler("start", start))
-app.add_handler(CommandHandler("help", help))
-app.add_handler(CommandHandler("add_task", add_task))
 
-print("Bot is running...")
-app.run_polling()
+if __name__ == "__main__":
+    main()
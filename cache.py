@@ -0,0 +1,230 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+from globals import (
+    OPENAI_CACHE_PATH,
+    OPENAI_CACHE_TTL_HOURS,
+    OPENAI_CACHE_MAX_MB,
+    PAGE_CACHE_PATH,
+    SQLITE_BUSY_TIMEOUT_MS,
+)
+
+
+class SQLiteCache:
+    """
+    Base class for caches stored in their own SQLite file
+    """
+
+    schema = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000
+        )
+        # batch.py da bir nechta process bitta page cache ga yozadi
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.schema)
+
+
+class ResponseCache(SQLiteCache):
+    """
+    Persistent content-addressed cache for OpenAI responses.
+    Entries expire after ttl_seconds and the least recently used ones are
+    evicted when the stored size grows over max_bytes.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_responses_accessed_at ON responses (accessed_at);
+        CREATE TABLE IF NOT EXISTS stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        """
+
+    def __init__(
+        self,
+        path: str = OPENAI_CACHE_PATH,
+        ttl_seconds: float = OPENAI_CACHE_TTL_HOURS * 3600,
+        max_bytes: int = int(OPENAI_CACHE_MAX_MB * 1024 * 1024),
+    ):
+        super().__init__(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(params: dict) -> str:
+        """
+        Hash of model, messages (image data URLs included) and other parameters
+        """
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str):
+        self.connection.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Return cached value or None if it is missing or expired
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self.misses += 1
+                self._count("misses")
+                return None
+
+            self.connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+            self._count("hits")
+            return json.loads(row[0])
+
+    def set(self, key: str, value: dict):
+        """
+        Store value and evict least recently used entries if cache is too big
+        """
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        self.connection.execute(
+            "DELETE FROM responses WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        (total,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        # Eng uzoq vaqt ishlatilmagan yozuvlardan boshlab o'chirish
+        stale = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters for this process and for the whole cache lifetime
+        """
+        with self.lock:
+            totals = dict(self.connection.execute("SELECT name, value FROM stats"))
+            entries, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+
+class PageCache(SQLiteCache):
+    """
+    Persistent cache of extracted page text and rendered page images.
+    Keyed by the source PDF content hash, page number and kind
+    ("text" or "image:<render settings>").
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS pages (
+            book_hash TEXT NOT NULL,
+            page_number INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            value BLOB NOT NULL,
+            PRIMARY KEY (book_hash, page_number, kind)
+        );
+        """
+
+    def __init__(self, path: str = PAGE_CACHE_PATH):
+        super().__init__(path)
+
+    def get_many(self, book_hash: str, kind: str, page_numbers) -> dict:
+        """
+        Return {page_number: value} for cached pages of the given kind
+        """
+        page_numbers = list(page_numbers)
+        if not page_numbers:
+            return {}
+
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT page_number, value FROM pages WHERE book_hash = ? AND kind = ? "
+                "AND page_number BETWEEN ? AND ?",
+                (book_hash, kind, min(page_numbers), max(page_numbers)),
+            ).fetchall()
+        wanted = set(page_numbers)
+        return {page: value for page, value in rows if page in wanted}
+
+    def set(self, book_hash: str, kind: str, page_number: int, value: bytes):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (book_hash, page_number, kind, value) "
+                "VALUES (?, ?, ?, ?)",
+                (book_hash, page_number, kind, value),
+            )
+
+
+_response_cache = None
+_page_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Process-wide ResponseCache shared by all EnglishAI instances
+    """
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+
+def get_page_cache() -> PageCache:
+    """
+    Process-wide PageCache shared by all open books
+    """
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
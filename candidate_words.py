@@ -0,0 +1,282 @@
+import re
+from collections import Counter
+
+# Lug'at uchun foydasiz so'zlar: artikllar, olmoshlar, yordamchi fe'llar va h.k.
+STOPWORDS = frozenset(
+    """
+    a about above after again against all also am an and any are as at be because been
+    before being below between both but by can could did do does doing down during each
+    either else even ever every few for from further get gets got had has have having he
+    her here hers herself him himself his how i if in into is it its itself just let me
+    more most much must my myself neither no nor not now of off often on once only or
+    other our ours ourselves out over own per please quite rather really same she should
+    so some such than that the their theirs them themselves then there these they this
+    those through to too under until up upon us very was we were what when where which
+    while who whom whose why will with would yes yet you your yours yourself yourselves
+    one two three four five six seven eight nine ten first second third next last
+    mr mrs ms page unit lesson exercise answer answers example look listen read write
+    complete match check tick circle choose correct underline ok
+    """.split()
+)
+
+# Qoidaga bo'ysunmaydigan ko'plik va o'tgan zamon shakllari
+IRREGULAR_FORMS = {
+    "children": "child",
+    "men": "man",
+    "women": "woman",
+    "people": "person",
+    "feet": "foot",
+    "teeth": "tooth",
+    "mice": "mouse",
+    "went": "go",
+    "gone": "go",
+    "came": "come",
+    "saw": "see",
+    "seen": "see",
+    "took": "take",
+    "taken": "take",
+    "made": "make",
+    "gave": "give",
+    "given": "give",
+    "ate": "eat",
+    "eaten": "eat",
+    "drank": "drink",
+    "wrote": "write",
+    "written": "write",
+    "bought": "buy",
+    "brought": "bring",
+    "thought": "think",
+    "taught": "teach",
+    "caught": "catch",
+    "felt": "feel",
+    "left": "leave",
+    "met": "meet",
+    "sat": "sit",
+    "slept": "sleep",
+    "spoke": "speak",
+    "spoken": "speak",
+    "told": "tell",
+    "said": "say",
+    "paid": "pay",
+    "ran": "run",
+    "swam": "swim",
+    "began": "begin",
+    "knew": "know",
+    "known": "know",
+    "flew": "fly",
+    "grew": "grow",
+    "wore": "wear",
+    "better": "good",
+    "best": "good",
+    "worse": "bad",
+    "worst": "bad",
+}
+
+# "ss", "us", "is" bilan tugagan so'zlar ko'plik emas (glass, bus, tennis)
+NOT_PLURAL_ENDINGS = ("ss", "us", "is", "ous")
+VOWELS = set("aeiou")
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+(?:['’][a-z]+)?")
+SENTENCE_END_PATTERN = re.compile(r"[.!?:]\s*$")
+# Qator oxirida bo'lingan so'zlar: "kitch-\nen"
+HYPHENATION_PATTERN = re.compile(r"(\w)-\n(\w)")
+
+
+def _undouble(stem: str) -> str:
+    # "running" -> "runn" -> "run", lekin "falling" -> "fall"
+    if len(stem) > 2 and stem[-1] == stem[-2] and stem[-1] not in "lsz" and stem[-1] not in VOWELS:
+        return stem[:-1]
+    return stem
+
+
+def _restore_e(stem: str) -> str:
+    # "making" -> "mak" -> "make", "living" -> "liv" -> "live"
+    if stem.endswith(("v", "z", "c", "dg")) or (
+        len(stem) == 3
+        and stem[0] not in VOWELS
+        and stem[1] in VOWELS
+        and stem[2] not in VOWELS | set("wxy")
+    ):
+        return stem + "e"
+    return stem
+
+
+def lemmatize(word: str) -> str:
+    """
+    Rule-based dictionary form of a lowercase English word.
+    Cheap and approximate: it only has to map inflected forms on the page to
+    the form words are stored in, wrong guesses just stay candidates.
+    """
+    if word in IRREGULAR_FORMS:
+        return IRREGULAR_FORMS[word]
+    if len(word) <= 3:
+        return word
+
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "shes", "ches", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(NOT_PLURAL_ENDINGS):
+        return word[:-1]
+
+    if word.endswith("ied") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("ing") and len(word) > 5:
+        stem = word[:-3]
+        undoubled = _undouble(stem)
+        return undoubled if undoubled != stem else _restore_e(stem)
+    if word.endswith("ed") and len(word) > 4:
+        stem = word[:-2]
+        if word.endswith("eed"):
+            # "agreed" -> "agree"
+            return word[:-1]
+        undoubled = _undouble(stem)
+        return undoubled if undoubled != stem else _restore_e(stem)
+    return word
+
+
+class Candidate:
+    """
+    Word found in the text that is worth sending to the model
+    """
+
+    def __init__(self, lemma: str, surface: str, count: int, snippet: str):
+        self.lemma = lemma
+        self.surface = surface
+        self.count = count
+        self.snippet = snippet
+
+    def __repr__(self):
+        return f"<Candidate({self.lemma}, count={self.count})>"
+
+
+def _snippet(text: str, start: int, end: int, width: int) -> str:
+    """
+    Part of the line around text[start:end], at most `width` characters
+    """
+    line_start = text.rfind("\n", 0, start) + 1
+    line_end = text.find("\n", end)
+    line_end = len(text) if line_end == -1 else line_end
+    left = max(line_start, start - width // 2)
+    right = min(line_end, end + width // 2)
+    return " ".join(text[left:right].split())
+
+
+def find_candidates(
+    text: str,
+    known=frozenset(),
+    max_candidates: int = None,
+    snippet_width: int = 80,
+    min_length: int = 3,
+) -> list:
+    """
+    Tokenize and lemmatize text, drop stopwords, proper names and known words,
+    and rank what is left by frequency (ties keep text order).
+
+    Args:
+        text (str): Page text
+        known: Callable(set of words) -> set of the known ones, or a set of
+            known normalized words. Both surface forms and lemmas are checked.
+        max_candidates (int): Keep only the most frequent words
+        snippet_width (int): Length of the context snippet of every word
+
+    Returns:
+        list[Candidate]: Most frequent first
+    """
+    text = HYPHENATION_PATTERN.sub(r"\1\2", text)
+
+    counts = Counter()
+    first_seen = {}
+    surfaces = {}
+    capitalized_only = {}
+    for match in TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        word = token.lower().replace("’", "'").split("'")[0]
+        if len(word) < min_length or word in STOPWORDS:
+            continue
+        lemma = lemmatize(word)
+        if lemma in STOPWORDS:
+            continue
+
+        counts[lemma] += 1
+        if lemma not in first_seen:
+            first_seen[lemma] = match.start(), match.end()
+            surfaces[lemma] = word
+
+        # Gap boshida bo'lmagan joyda ham katta harf bilan yozilsa - ism yoki joy nomi
+        before = text[max(0, match.start() - 20) : match.start()].rstrip(" \t\"'(")
+        sentence_start = not before or before.endswith("\n") or SENTENCE_END_PATTERN.search(before)
+        if not token[0].isupper():
+            capitalized_only[lemma] = False
+        elif not sentence_start:
+            capitalized_only.setdefault(lemma, True)
+
+    lemmas = [lemma for lemma in counts if not capitalized_only.get(lemma, False)]
+
+    if callable(known):
+        known_words = known(set(lemmas) | {surfaces[lemma] for lemma in lemmas})
+    else:
+        known_words = known
+    known_words = {word.casefold() for word in known_words}
+    lemmas = [
+        lemma
+        for lemma in lemmas
+        if lemma not in known_words and surfaces[lemma] not in known_words
+    ]
+
+    lemmas.sort(key=lambda lemma: (-counts[lemma], first_seen[lemma][0]))
+    if max_candidates:
+        lemmas = lemmas[:max_candidates]
+
+    return [
+        Candidate(
+            lemma,
+            surfaces[lemma],
+            counts[lemma],
+            _snippet(text, *first_seen[lemma], snippet_width),
+        )
+        for lemma in lemmas
+    ]
+
+
+def format_candidates(candidates: list) -> str:
+    """
+    One candidate per line for the prompt: "word | context snippet".
+    The word is sent as it appears in the text, the model gives its dictionary form.
+    """
+    return "\n".join(f"{candidate.surface} | {candidate.snippet}" for candidate in candidates)
+
+
+def assign_translations(candidates: list, translations: dict) -> list:
+    """
+    Match model answers back to the candidates that were sent. The model
+    answers with dictionary forms or phrases ("houses" -> "house",
+    "get" -> "get up"), so a candidate matches an answer when its word or
+    lemma is one of the answer's words or their lemmas. Unmatched
+    candidates were skipped by the model.
+
+    Returns:
+        list[tuple]: (word, english, uzbek or None) rows for translation memory
+    """
+    answers = []
+    rows = []
+    for english, uzbek in translations.items():
+        if not isinstance(uzbek, str) or not english.strip():
+            continue
+        words = [word.lower() for word in TOKEN_PATTERN.findall(english)]
+        answers.append((english.strip(), uzbek.strip(), set(words) | {lemmatize(word) for word in words}))
+        rows.append((english, english.strip(), uzbek.strip()))
+
+    for candidate in candidates:
+        match = next(
+            (
+                (english, uzbek)
+                for english, uzbek, words in answers
+                if candidate.surface in words or candidate.lemma in words
+            ),
+            (candidate.lemma, None),
+        )
+        rows.append((candidate.surface, *match))
+        if candidate.lemma != candidate.surface:
+            rows.append((candidate.lemma, *match))
+    return rows
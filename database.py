@@ -1,13 +1,62 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, Text, DateTime, inspect
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, validates
 from sqlalchemy.exc import IntegrityError
-from typing import Optional, Union
+from typing import Any, Iterable, Optional, Union
+from datetime import datetime, timezone
+import json
+from globals import DATABASE_PATH, DATABASE_POOL_SIZE, SQLITE_BUSY_TIMEOUT_MS
 
-# Create database engine
-engine = create_engine('sqlite:///vocabulary.db')
+# Create database engine. Bitta engine va connection pool butun process uchun
+# umumiy: Telegram joblari va Notion sync threadlarda bir vaqtda ishlaydi.
+engine = create_engine(
+    f'sqlite:///{DATABASE_PATH}',
+    pool_size=DATABASE_POOL_SIZE,
+    max_overflow=DATABASE_POOL_SIZE,
+    pool_pre_ping=True,
+    connect_args={'check_same_thread': False, 'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+)
+# Yozuvchi sessiyalar tranzaksiyani BEGIN IMMEDIATE bilan boshlaydi
+write_engine = engine.execution_options(begin_immediate=True)
 Base = declarative_base()
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+WriteSession = sessionmaker(bind=write_engine, expire_on_commit=False)
+
+# SQLite bitta so'rovdagi parametrlar soniga limit qo'yadi
+SQLITE_MAX_VARIABLES = 500
+
+# PRAGMA user_version dagi sxema versiyasi, _migrate ga qarang
+SCHEMA_VERSION = 2
+
+@event.listens_for(engine, 'connect')
+def _configure_connection(dbapi_connection, connection_record):
+    """
+    WAL lets readers work while one writer commits, busy_timeout makes
+    writers wait for the lock instead of failing with "database is locked"
+    """
+    # pysqlite o'zi BEGIN yubormasin, tranzaksiyani _begin boshlaydi
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}')
+    cursor.close()
+
+@event.listens_for(engine, 'begin')
+def _begin(connection):
+    # Oddiy BEGIN da o'qishdan yozishga o'tishda busy_timeout ishlamaydi
+    # va darrov "database is locked" chiqadi, shuning uchun yozish uchun IMMEDIATE
+    if connection.get_execution_options().get('begin_immediate'):
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    else:
+        connection.exec_driver_sql('BEGIN')
+
+def normalize_word(word: str) -> str:
+    """
+    Lookup key of a word: trimmed, single spaces, case-insensitive
+    """
+    return " ".join(word.split()).casefold()
 
 class Word(Base):
     __tablename__ = 'vocabulary'
@@ -15,14 +64,138 @@ class Word(Base):
     id = Column(Integer, primary_key=True)
     english = Column(String, unique=True, nullable=False)
     uzbek = Column(String, nullable=False)
+    # normalize_word() natijasi, qidiruv faqat shu ustunlar bo'yicha
+    english_key = Column(String, unique=True, index=True, nullable=False)
+    uzbek_key = Column(String, index=True, nullable=False)
     is_memorized = Column(Boolean, default=False)
+    notion_page_id = Column(String, unique=True, index=True)
+
+    @validates('english', 'uzbek')
+    def _set_lookup_key(self, name, value):
+        setattr(self, f'{name}_key', normalize_word(value))
+        return value
 
     def __repr__(self):
         return f"<Word(english='{self.english}', uzbek='{self.uzbek}', is_memorized={self.is_memorized})>"
 
+class SyncState(Base):
+    __tablename__ = 'sync_state'
+    
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
+    def __repr__(self):
+        return f"<SyncState(key='{self.key}', value='{self.value}')>"
+
+class PipelineCheckpoint(Base):
+    __tablename__ = 'pipeline_checkpoints'
+    
+    job_key = Column(String, primary_key=True)
+    name = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<PipelineCheckpoint(job_key='{self.job_key}', name='{self.name}')>"
+
+class TranslationMemory(Base):
+    """
+    Every translation the model returned, keyed by normalized word as it was
+    found in the book. uzbek is NULL when the model skipped the word as noise.
+    """
+    __tablename__ = 'translation_memory'
+    
+    key = Column(String, primary_key=True)
+    english = Column(String, nullable=False)
+    uzbek = Column(String)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<TranslationMemory(key='{self.key}', english='{self.english}', uzbek='{self.uzbek}')>"
+
+class BookIndex(Base):
+    """
+    Unit table of contents of a PDF book, keyed by SHA-256 of the file
+    """
+    __tablename__ = 'book_indexes'
+    
+    content_hash = Column(String, primary_key=True)
+    path = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+    units = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<BookIndex(path='{self.path}', version={self.version})>"
+
+def _migrate(connection, version: int):
+    """
+    Bring an existing vocabulary table from schema `version` to SCHEMA_VERSION
+    """
+    columns = {column['name'] for column in inspect(connection).get_columns('vocabulary')}
+    if version < 1:
+        if 'notion_page_id' not in columns:
+            connection.exec_driver_sql('ALTER TABLE vocabulary ADD COLUMN notion_page_id VARCHAR')
+        connection.exec_driver_sql(
+            'CREATE UNIQUE INDEX IF NOT EXISTS ix_vocabulary_notion_page_id ON vocabulary (notion_page_id)'
+        )
+    if version < 2:
+        for column in ('english_key', 'uzbek_key'):
+            if column not in columns:
+                connection.exec_driver_sql(f'ALTER TABLE vocabulary ADD COLUMN {column} VARCHAR')
+        # SQLite lower() faqat ASCII ni biladi, kalitlar Pythonda hisoblanadi
+        seen = set()
+        for word_id, english, uzbek in connection.exec_driver_sql(
+            'SELECT id, english, uzbek FROM vocabulary ORDER BY id'
+        ).fetchall():
+            english_key = normalize_word(english)
+            if english_key in seen:
+                # "Apple" va "apple " endi bitta so'z, birinchisi qoladi
+                connection.exec_driver_sql('DELETE FROM vocabulary WHERE id = ?', (word_id,))
+                continue
+            seen.add(english_key)
+            connection.exec_driver_sql(
+                'UPDATE vocabulary SET english_key = ?, uzbek_key = ? WHERE id = ?',
+                (english_key, normalize_word(uzbek), word_id),
+            )
+        connection.exec_driver_sql(
+            'CREATE UNIQUE INDEX IF NOT EXISTS ix_vocabulary_english_key ON vocabulary (english_key)'
+        )
+        connection.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_vocabulary_uzbek_key ON vocabulary (uzbek_key)'
+        )
+
+_initialized = False
+
 def init_db():
-    """Initialize database by creating all tables"""
-    Base.metadata.create_all(engine)
+    """
+    Initialize database by creating all tables and running migrations.
+    Called once at startup (bot.py, agent.main); later calls do nothing.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with write_engine.begin() as connection:
+        version = connection.exec_driver_sql('PRAGMA user_version').scalar()
+        if inspect(connection).has_table('vocabulary') and version < SCHEMA_VERSION:
+            _migrate(connection, version)
+        Base.metadata.create_all(connection)
+        connection.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    _initialized = True
+
+def _word_row(english: str, uzbek: str, **values) -> dict:
+    """
+    Column values of a new word for Core insert statements (validates does not run there)
+    """
+    english = " ".join(english.split())
+    uzbek = " ".join(uzbek.split())
+    return {
+        'english': english,
+        'uzbek': uzbek,
+        'english_key': normalize_word(english),
+        'uzbek_key': normalize_word(uzbek),
+        **values,
+    }
 
 def word_exists(word: str, language: str = 'english') -> bool:
     """
@@ -35,20 +208,16 @@ def word_exists(word: str, language: str = 'english') -> bool:
     Returns:
         bool: True if word exists, False otherwise
     """
-    word = word.strip().capitalize()
+    column = Word.english_key if language == 'english' else Word.uzbek_key
     session = Session()
     try:
-        if language == 'english':
-            exists = session.query(Word).filter(Word.english == word).first() is not None
-        else:
-            exists = session.query(Word).filter(Word.uzbek == word).first() is not None
-        return exists
+        return session.query(Word.id).filter(column == normalize_word(word)).first() is not None
     finally:
         session.close()
 
 def create_word(english: str, uzbek: str) -> Union[Word, None]:
     """
-    Create new word in database with capitalized first letters
+    Create new word in database. Spelling is kept, lookups use normalized keys
     
     Args:
         english (str): English word
@@ -57,12 +226,9 @@ def create_word(english: str, uzbek: str) -> Union[Word, None]:
     Returns:
         Word: Created word object or None if creation failed
     """
-    english = english.strip().capitalize()
-    uzbek = uzbek.strip().capitalize()
-    
-    session = Session()
+    session = WriteSession()
     try:
-        word = Word(english=english, uzbek=uzbek)
+        word = Word(english=" ".join(english.split()), uzbek=" ".join(uzbek.split()))
         session.add(word)
         session.commit()
         return word
@@ -83,16 +249,295 @@ def get_word(text: str, language: str = 'english') -> Optional[Word]:
     Returns:
         Optional[Word]: Word object if found, None otherwise
     """
-    text = text.strip().capitalize()
+    column = Word.english_key if language == 'english' else Word.uzbek_key
     session = Session()
     try:
-        if language == 'english':
-            word = session.query(Word).filter(Word.english == text).first()
-        else:
-            word = session.query(Word).filter(Word.uzbek == text).first()
-        return word
+        return session.query(Word).filter(column == normalize_word(text)).first()
+    finally:
+        session.close()
+
+def _chunks(items: list, size: int = SQLITE_MAX_VARIABLES):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+def existing_words(words: Iterable[str], language: str = 'english') -> set:
+    """
+    Return the subset of words that already exist in database
+    
+    Args:
+        words (Iterable[str]): Words to check
+        language (str): Language of the words ('english' or 'uzbek')
+    
+    Returns:
+        set: Given words (with their original spelling) whose normalized key is stored
+    """
+    words = list(words)
+    keys = list({normalize_word(word) for word in words})
+    column = Word.english_key if language == 'english' else Word.uzbek_key
+    session = Session()
+    try:
+        found = set()
+        for chunk in _chunks(keys):
+            found.update(row[0] for row in session.query(column).filter(column.in_(chunk)))
+        return {word for word in words if normalize_word(word) in found}
+    finally:
+        session.close()
+
+def lookup_translations(words: Iterable[str]) -> dict:
+    """
+    Find remembered translations of words
+    
+    Args:
+        words (Iterable[str]): Words as they appear in the text
+    
+    Returns:
+        dict: {word: (english, uzbek)} for remembered words, uzbek is None
+            for words the model skipped before
+    """
+    words = list(words)
+    keys = list({normalize_word(word) for word in words})
+    session = Session()
+    try:
+        found = {}
+        for chunk in _chunks(keys):
+            for row in session.query(TranslationMemory).filter(TranslationMemory.key.in_(chunk)):
+                found[row.key] = (row.english, row.uzbek)
+        return {word: found[normalize_word(word)] for word in words if normalize_word(word) in found}
+    finally:
+        session.close()
+
+def save_translations(rows: Iterable[tuple]) -> int:
+    """
+    Remember translations in one transaction, newer answers replace older ones
+    
+    Args:
+        rows (Iterable[tuple]): (word, english, uzbek) rows, uzbek may be None
+    
+    Returns:
+        int: Number of saved rows
+    """
+    now = datetime.now(timezone.utc)
+    rows = {
+        normalize_word(word): {'key': normalize_word(word), 'english': english, 'uzbek': uzbek, 'updated_at': now}
+        for word, english, uzbek in rows
+        if normalize_word(word)
+    }
+    if not rows:
+        return 0
+
+    session = WriteSession()
+    try:
+        for chunk in _chunks(list(rows.values()), SQLITE_MAX_VARIABLES // 4):
+            statement = insert(TranslationMemory).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=[TranslationMemory.key],
+                set_={
+                    'english': statement.excluded.english,
+                    'uzbek': statement.excluded.uzbek,
+                    'updated_at': statement.excluded.updated_at,
+                },
+            )
+            session.execute(statement)
+        session.commit()
+        return len(rows)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def get_sync_state(key: str) -> Optional[str]:
+    """
+    Get stored sync value (for example Notion watermark) by key
+    """
+    session = Session()
+    try:
+        state = session.get(SyncState, key)
+        return state.value if state else None
+    finally:
+        session.close()
+
+def set_sync_state(key: str, value: Optional[str]):
+    """
+    Store sync value by key
+    """
+    session = WriteSession()
+    try:
+        session.merge(SyncState(key=key, value=value))
+        session.commit()
+    finally:
+        session.close()
+
+def upsert_notion_words(rows: Iterable[tuple]) -> int:
+    """
+    Insert or update words coming from Notion in one transaction
+    
+    Args:
+        rows (Iterable[tuple]): (notion_page_id, english, uzbek) rows
+    
+    Returns:
+        int: Number of inserted or updated words
+    """
+    rows = {
+        page_id: _word_row(english, uzbek, notion_page_id=page_id)
+        for page_id, english, uzbek in rows
+    }
+    # Notionda bir so'z ikki marta yozilgan bo'lsa oxirgisi qoladi
+    rows = {row['english_key']: row for row in rows.values()}
+    rows = {row['notion_page_id']: row for row in rows.values()}
+    if not rows:
+        return 0
+
+    session = WriteSession()
+    try:
+        # Notionda nomi o'zgargan so'zlarning eski yozuvini o'chirish
+        for chunk in _chunks(list(rows)):
+            for word in session.query(Word).filter(Word.notion_page_id.in_(chunk)):
+                if word.english_key != rows[word.notion_page_id]['english_key']:
+                    session.delete(word)
+        session.flush()
+
+        synced = 0
+        for chunk in _chunks(list(rows.values()), SQLITE_MAX_VARIABLES // 5):
+            statement = insert(Word).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Word.english_key],
+                set_={
+                    'english': statement.excluded.english,
+                    'uzbek': statement.excluded.uzbek,
+                    'uzbek_key': statement.excluded.uzbek_key,
+                    'notion_page_id': statement.excluded.notion_page_id,
+                },
+            )
+            synced += session.execute(statement).rowcount
+        session.commit()
+        return synced
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def delete_words_by_page_ids(page_ids: Iterable[str]) -> int:
+    """
+    Delete words whose Notion pages were removed
+    """
+    page_ids = list(page_ids)
+    session = WriteSession()
+    try:
+        deleted = 0
+        for chunk in _chunks(page_ids):
+            deleted += session.query(Word).filter(Word.notion_page_id.in_(chunk)).delete(
+                synchronize_session=False
+            )
+        session.commit()
+        return deleted
+    finally:
+        session.close()
+
+def delete_words_not_in(page_ids: Iterable[str]) -> int:
+    """
+    Delete every word that is not linked to one of the given Notion pages.
+    Used after a full sync to drop words removed from Notion.
+    """
+    page_ids = set(page_ids)
+    session = WriteSession()
+    try:
+        stale = [
+            word_id
+            for word_id, page_id in session.query(Word.id, Word.notion_page_id)
+            if page_id not in page_ids
+        ]
+        for chunk in _chunks(stale):
+            session.query(Word).filter(Word.id.in_(chunk)).delete(synchronize_session=False)
+        session.commit()
+        return len(stale)
     finally:
         session.close()
 
-# Initialize database when module is imported
-init_db()
+def get_checkpoint(job_key: str, name: str, default: Any = None) -> Any:
+    """
+    Get saved result of a pipeline step
+    
+    Args:
+        job_key (str): Pipeline job key (book and page range)
+        name (str): Step name, e.g. 'vocabulary' or 'lesson:3'
+        default: Value returned when step is not saved yet
+    """
+    session = Session()
+    try:
+        checkpoint = session.get(PipelineCheckpoint, (job_key, name))
+        return json.loads(checkpoint.value) if checkpoint else default
+    finally:
+        session.close()
+
+def save_checkpoint(job_key: str, name: str, value: Any):
+    """
+    Save result of a pipeline step as JSON, replacing the previous value
+    """
+    session = WriteSession()
+    try:
+        session.merge(
+            PipelineCheckpoint(
+                job_key=job_key,
+                name=name,
+                value=json.dumps(value, ensure_ascii=False),
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+        session.commit()
+    finally:
+        session.close()
+
+def clear_checkpoints(job_key: str) -> int:
+    """
+    Delete all saved steps of a job so it runs from scratch
+    """
+    session = WriteSession()
+    try:
+        deleted = session.query(PipelineCheckpoint).filter(
+            PipelineCheckpoint.job_key == job_key
+        ).delete(synchronize_session=False)
+        session.commit()
+        return deleted
+    finally:
+        session.close()
+
+def get_book_index(content_hash: str, version: int) -> Optional[list]:
+    """
+    Get saved unit index of a book
+
+    Args:
+        content_hash (str): SHA-256 of the PDF file
+        version (int): Index format version, older indexes are ignored
+
+    Returns:
+        list | None: Units as dicts
+    """
+    session = Session()
+    try:
+        index = session.get(BookIndex, content_hash)
+        if index is None or index.version != version:
+            return None
+        return json.loads(index.units)
+    finally:
+        session.close()
+
+def save_book_index(content_hash: str, path: str, version: int, units: list):
+    """
+    Save unit index of a book, replacing the previous one
+    """
+    session = WriteSession()
+    try:
+        session.merge(
+            BookIndex(
+                content_hash=content_hash,
+                path=path,
+                version=version,
+                units=json.dumps(units, ensure_ascii=False),
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+        session.commit()
+    finally:
+        session.close()
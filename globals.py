@@ -8,3 +8,30 @@ NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 NOTION_VOCABULARY_DB = os.getenv("NOTION_VOCABULARY_DB")
 NOTION_GRAMMAR_PAGE = os.getenv("NOTION_GRAMMAR_PAGE")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+NOTION_FULL_SYNC_HOURS = float(os.getenv("NOTION_FULL_SYNC_HOURS", "24"))
+NOTION_REQUESTS_PER_SECOND = float(os.getenv("NOTION_REQUESTS_PER_SECOND", "3"))
+NOTION_MAX_CONCURRENCY = int(os.getenv("NOTION_MAX_CONCURRENCY", "3"))
+OPENAI_CACHE_PATH = os.getenv("OPENAI_CACHE_PATH", "ai_cache.db")
+OPENAI_CACHE_TTL_HOURS = float(os.getenv("OPENAI_CACHE_TTL_HOURS", "720"))
+OPENAI_CACHE_MAX_MB = float(os.getenv("OPENAI_CACHE_MAX_MB", "200"))
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "page_cache.db")
+VOCABULARY_CHUNK_TOKENS = int(os.getenv("VOCABULARY_CHUNK_TOKENS", "3000"))
+GRAMMAR_PAGES_PER_REQUEST = int(os.getenv("GRAMMAR_PAGES_PER_REQUEST", "2"))
+GRAMMAR_TEXT_PAGES_PER_REQUEST = int(os.getenv("GRAMMAR_TEXT_PAGES_PER_REQUEST", "6"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "3"))
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com")
+TELEMETRY_LOG_PATH = os.getenv("TELEMETRY_LOG_PATH", "telemetry.jsonl")
+METRICS_PATH = os.getenv("METRICS_PATH", "metrics.prom")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+DATABASE_PATH = os.getenv("DATABASE_PATH", "vocabulary.db")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+VOCABULARY_MAX_CANDIDATES = int(os.getenv("VOCABULARY_MAX_CANDIDATES", "80"))
+LESSON_STREAMING = os.getenv("LESSON_STREAMING", "1") not in ("0", "false", "False", "")
+BOOKS_DIR = os.getenv("BOOKS_DIR", "books")
+DEFAULT_BOOK = os.getenv("DEFAULT_BOOK", "A1.pdf")
+OPENAI_BATCH_DIR = os.getenv("OPENAI_BATCH_DIR", "batches")
+OPENAI_BATCH_POLL_SECONDS = float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "30"))
+OPENAI_BATCH_MAX_REQUESTS = int(os.getenv("OPENAI_BATCH_MAX_REQUESTS", "50000"))
@@ -0,0 +1,80 @@
+import re
+
+# Text layer shorter than this is treated as a scanned or image-only page
+MIN_TEXT_LENGTH = 80
+MIN_LETTER_RATIO = 0.5
+MAX_GARBAGE_RATIO = 0.05
+
+# "2 Home", "12 Free time" - unit sarlavhasi, "2A What are you?" emas
+MAIN_TOPIC_PATTERN = re.compile(r"^\s*(\d{1,2})\s+([A-Z][A-Za-z'&,\-]*(?: [A-Za-z'&,\-]+){0,2})\s*$")
+# PDF outline dagi unit sarlavhasi: "Unit 3 Family", "3. Family", "3 Family"
+OUTLINE_UNIT_PATTERN = re.compile(r"^\s*(?:unit\s+)?(\d{1,2})\s*[.:\-–]?\s+(\S.*?)\s*$", re.IGNORECASE)
+# Kitob sahifasidagi grammar bo'limi: "Grammar: Present Simple", "GRAMMAR - can / can't"
+GRAMMAR_HEADING_PATTERN = re.compile(r"^\s*grammar\s*[:\-–]\s*(\S.*?)\s*$", re.IGNORECASE)
+# PyPDF2 font kodini o'qiy olmasa "(cid:12)" qaytaradi
+GARBAGE_PATTERN = re.compile(r"\(cid:\d+\)|�")
+
+
+def is_reliable_text(text: str) -> bool:
+    """
+    Check whether page text layer looks usable instead of rendering the page
+    """
+    stripped = "".join(text.split())
+    if len(stripped) < MIN_TEXT_LENGTH:
+        return False
+
+    letters = sum(character.isalpha() for character in stripped)
+    if letters / len(stripped) < MIN_LETTER_RATIO:
+        return False
+
+    garbage = sum(len(match) for match in GARBAGE_PATTERN.findall(text))
+    if garbage / len(stripped) > MAX_GARBAGE_RATIO:
+        return False
+
+    # So'zlar bo'sh joysiz yopishib qolgan matn (masalan "Presentsimpleisusedfor")
+    words = text.split()
+    return len(stripped) / len(words) <= 15
+
+
+def find_main_topic(text: str):
+    """
+    Find numbered unit heading ("2 Home") in the first lines of the page.
+    Titles longer than three words are skipped, they are usually exercises
+    ("1 Complete the sentences with ...").
+
+    Returns:
+        dict | None: {'number': int, 'title': str}
+    """
+    lines = [line for line in text.splitlines() if line.strip()][:2]
+    for line in lines:
+        match = MAIN_TOPIC_PATTERN.match(line)
+        if match:
+            return {"number": int(match.group(1)), "title": match.group(2).strip()}
+    return None
+
+
+def parse_unit_title(title: str):
+    """
+    Unit number and title from a PDF outline entry ("Unit 3 Family")
+
+    Returns:
+        dict | None: {'number': int, 'title': str}
+    """
+    match = OUTLINE_UNIT_PATTERN.match(title)
+    if not match:
+        return None
+    return {"number": int(match.group(1)), "title": match.group(2)}
+
+
+def find_grammar_headings(text: str) -> list:
+    """
+    Grammar section headings printed on the page ("Grammar: Present Simple")
+
+    Returns:
+        list[str]: Grammar titles in page order
+    """
+    return [
+        match.group(1)
+        for match in map(GRAMMAR_HEADING_PATTERN.match, text.splitlines())
+        if match
+    ]
@@ -0,0 +1,131 @@
+import asyncio
+import uuid
+from globals import JOB_WORKERS
+
+# Xotirada saqlanadigan tugagan joblar soni
+MAX_KEPT_JOBS = 200
+
+# Pipeline bosqichlari: start_agent yuboradigan kalitlar va foydalanuvchiga ko'rinadigan nomlar
+STAGES = {
+    "pdf": "PDF",
+    "vocabulary": "Vocabulary",
+    "notion_sync": "Notion sync",
+    "grammar": "Grammar",
+    "lessons": "Lessons",
+}
+
+
+class Job:
+    """
+    One /add_task request and its progress
+    """
+
+    def __init__(self, chat_id: str, message: str, on_update=None, force: bool = False):
+        self.id = uuid.uuid4().hex[:8]
+        self.chat_id = chat_id
+        self.message = message
+        # saqlangan bosqichlarni o'chirib qaytadan yaratish
+        self.force = force
+        self.status = "queued"
+        self.stages = {}
+        self.error = None
+        self.result = None
+        self.on_update = on_update
+
+    async def progress(self, stage: str, detail: str):
+        """
+        Callback for start_agent: remember stage result and notify the chat
+        """
+        self.stages[stage] = detail
+        await self.notify()
+
+    async def notify(self):
+        if self.on_update is None:
+            return
+        try:
+            await self.on_update(self)
+        except Exception as e:
+            # Status xabarini yangilab bo'lmasa ham job davom etadi
+            print(f"⚠️ Could not update job {self.id} status: {e}")
+
+    def render(self) -> str:
+        """
+        Status message text
+        """
+        icons = {"queued": "🕒", "running": "⚙️", "done": "✅", "failed": "❌"}
+        lines = [f"{icons[self.status]} Job {self.id}: {self.message} ({self.status})"]
+        for stage, title in STAGES.items():
+            if stage in self.stages:
+                lines.append(f"✔️ {title}: {self.stages[stage]}")
+            else:
+                lines.append(f"▫️ {title}")
+        if self.error:
+            lines.append(f"Error: {self.error}")
+        return "\n".join(lines)
+
+
+class JobQueue:
+    """
+    Bounded pool of workers that run pipeline jobs in the background
+    """
+
+    def __init__(self, run_job, worker_count: int = JOB_WORKERS):
+        """
+        Args:
+            run_job: async callable(job) that runs the pipeline and returns its result
+            worker_count (int): How many jobs may run at the same time
+        """
+        self.run_job = run_job
+        self.worker_count = worker_count
+        self.queue = asyncio.Queue()
+        self.jobs = {}
+        self.workers = []
+
+    def start(self):
+        self.workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+        ]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, chat_id: str, message: str, on_update=None, force: bool = False) -> Job:
+        """
+        Add job to the queue and return it immediately
+        """
+        job = Job(chat_id, message, on_update, force)
+        self._forget_finished_jobs()
+        self.jobs[job.id] = job
+        self.queue.put_nowait(job)
+        return job
+
+    def _forget_finished_jobs(self):
+        finished = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.status in ("done", "failed")
+        ]
+        for job_id in finished[: max(0, len(finished) - MAX_KEPT_JOBS)]:
+            del self.jobs[job_id]
+
+    @property
+    def pending(self) -> int:
+        return self.queue.qsize()
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                job.status = "running"
+                await job.notify()
+                job.result = await self.run_job(job)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                await job.notify()
+                self.queue.task_done()
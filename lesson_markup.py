@@ -0,0 +1,261 @@
+import re
+from notion_blocks import MAX_BLOCKS_PER_REQUEST, prepare_block
+
+# Notion bitta so'rovda faqat 2 daraja ichma-ich blockni qabul qiladi
+MAX_NESTING_DEPTH = 2
+
+# Qator boshidagi belgi -> Notion block turi
+LINE_PATTERNS = [
+    (re.compile(r"^###\s+(.*)$"), "heading_3"),
+    (re.compile(r"^##\s+(.*)$"), "heading_2"),
+    (re.compile(r"^#\s+(.*)$"), "heading_1"),
+    (re.compile(r"^\[([ xX])\]\s+(.*)$"), "to_do"),
+    (re.compile(r"^[-*]\s+(.*)$"), "bulleted_list_item"),
+    (re.compile(r"^\d+[.)]\s+(.*)$"), "numbered_list_item"),
+    (re.compile(r"^!>\s*(.*)$"), "callout"),
+    (re.compile(r"^>\s?(.*)$"), "quote"),
+    (re.compile(r"^\+\s+(.*)$"), "toggle"),
+]
+DIVIDER_PATTERN = re.compile(r"^(-{3,}|\*{3,})$")
+FENCE_PATTERN = re.compile(r"^```\s*([\w+#-]*)\s*$")
+
+# **bold**, `code`, [text](url), *italic* yoki _italic_
+INLINE_PATTERN = re.compile(
+    r"\*\*(?P<bold>.+?)\*\*"
+    r"|`(?P<code>[^`]+)`"
+    r"|\[(?P<link_text>[^\]]+)\]\((?P<url>https?://[^)\s]+)\)"
+    r"|(?<![\w*])\*(?P<italic>[^*\s](?:[^*]*[^*\s])?)\*(?![\w*])"
+    r"|(?<!\w)_(?P<italic2>[^_\s](?:[^_]*[^_\s])?)_(?!\w)"
+)
+
+# Notion ichiga children qo'yib bo'lmaydigan blocklar
+NO_CHILDREN_TYPES = {"heading_1", "heading_2", "heading_3", "divider", "code"}
+
+CODE_LANGUAGES = {"python", "javascript", "json", "bash", "plain text"}
+
+
+def parse_inline(text: str, annotations: dict = None) -> list:
+    """
+    Turn inline Markdown into Notion rich_text items
+    """
+    annotations = annotations or {}
+    items = []
+
+    def add(content: str, extra: dict = None, url: str = None):
+        if not content:
+            return
+        item_annotations = {**annotations, **(extra or {})}
+        item = {"type": "text", "text": {"content": content}}
+        if url:
+            item["text"]["link"] = {"url": url}
+        if item_annotations:
+            item["annotations"] = item_annotations
+        # Bir xil formatdagi qo'shni bo'laklarni birlashtirish
+        if items and not url and items[-1].get("annotations") == item.get("annotations") and "link" not in items[-1]["text"]:
+            items[-1]["text"]["content"] += content
+        else:
+            items.append(item)
+
+    position = 0
+    for match in INLINE_PATTERN.finditer(text):
+        add(text[position : match.start()])
+        if match.group("bold") is not None:
+            for item in parse_inline(match.group("bold"), {**annotations, "bold": True}):
+                add(item["text"]["content"], item.get("annotations"), item["text"].get("link", {}).get("url"))
+        elif match.group("code") is not None:
+            add(match.group("code"), {"code": True})
+        elif match.group("url") is not None:
+            add(match.group("link_text"), url=match.group("url"))
+        else:
+            italic = match.group("italic") if match.group("italic") is not None else match.group("italic2")
+            for item in parse_inline(italic, {**annotations, "italic": True}):
+                add(item["text"]["content"], item.get("annotations"), item["text"].get("link", {}).get("url"))
+        position = match.end()
+    add(text[position:])
+    return items
+
+
+def _text_block(block_type: str, text: str, **extra) -> dict:
+    return {
+        "object": "block",
+        "type": block_type,
+        block_type: {"rich_text": parse_inline(text), **extra},
+    }
+
+
+def parse_line(line: str) -> dict:
+    """
+    Block of one (unindented) markup line. Text is kept in "_text" until
+    the block is finished.
+    """
+    if DIVIDER_PATTERN.match(line):
+        return {"object": "block", "type": "divider", "divider": {}}
+
+    for pattern, block_type in LINE_PATTERNS:
+        match = pattern.match(line)
+        if not match:
+            continue
+        if block_type == "to_do":
+            return {"type": block_type, "_text": match.group(2), "checked": match.group(1) != " "}
+        text = match.group(1)
+        if block_type == "callout":
+            icon, _, rest = text.partition(" ")
+            # Birinchi so'z harfsiz bo'lsa (emoji) u icon bo'ladi
+            if icon and not any(character.isalnum() for character in icon):
+                return {"type": block_type, "_text": rest, "icon": icon}
+            return {"type": block_type, "_text": text, "icon": "💡"}
+        return {"type": block_type, "_text": text}
+
+    return {"type": "paragraph", "_text": line}
+
+
+def _finish(block: dict) -> dict:
+    """
+    Turn parsed block into a Notion block
+    """
+    block_type = block["type"]
+    if block_type == "divider":
+        return block
+    if block_type == "code":
+        language = block.get("language") or "plain text"
+        return {
+            "object": "block",
+            "type": "code",
+            "code": {
+                "rich_text": [{"type": "text", "text": {"content": block["_text"]}}],
+                "language": language if language in CODE_LANGUAGES else "plain text",
+            },
+        }
+
+    extra = {}
+    if block_type == "to_do":
+        extra["checked"] = block["checked"]
+    elif block_type == "callout":
+        extra["icon"] = {"type": "emoji", "emoji": block["icon"]}
+    result = _text_block(block_type, block["_text"].strip(), **extra)
+    children = [_finish(child) for child in block.get("children", [])]
+    if children:
+        result[block_type]["children"] = children
+    return result
+
+
+class MarkupParser:
+    """
+    Incremental compiler from lesson markup to Notion blocks.
+
+    Markup is restricted Markdown, one block per line:
+        # / ## / ###     headings
+        - item, 1. item  bulleted and numbered list items
+        [ ] task         to-do ([x] is checked)
+        > text           quote
+        !> 💡 text       callout, optional emoji icon
+        + title          toggle, indented lines below it are its content
+        ---              divider
+        ```lang          code block until the closing ```
+    Inline: **bold**, *italic*, `code`, [text](https://link).
+    Lines indented under a block become its children (at most two levels,
+    deeper lines are attached to the second level). Every other line is a
+    block of its own, plain text is a paragraph.
+
+    feed() returns top-level blocks that are complete, i.e. a new top-level
+    block has started after them. close() returns the rest. Every block is
+    already split to fit Notion rich_text limits.
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.root = None
+        # (indent, block) zanjiri: root va uning oxirgi avlodlari
+        self.stack = []
+        self.fence = None
+
+    def feed(self, text: str) -> list:
+        self.pending += text
+        *lines, self.pending = self.pending.split("\n")
+        blocks = []
+        for line in lines:
+            blocks.extend(self._line(line))
+        return blocks
+
+    def close(self) -> list:
+        blocks = self._line(self.pending) if self.pending else []
+        self.pending = ""
+        # yopilmagan ``` bloki ham shu yerda tugaydi
+        self.fence = None
+        blocks.extend(self._emit())
+        return blocks
+
+    def _emit(self) -> list:
+        if self.root is None:
+            return []
+        root = self.root
+        self.root = None
+        self.stack = []
+        return prepare_block(_finish(root))
+
+    def _line(self, line: str) -> list:
+        line = line.rstrip().replace("\t", "    ")
+
+        if self.fence is not None:
+            if line.strip() == "```":
+                self.fence = None
+            else:
+                code = self.fence["_text"]
+                self.fence["_text"] = f"{code}\n{line}" if code else line
+            return []
+
+        if not line.strip():
+            return []
+
+        indent = len(line) - len(line.lstrip())
+        content = line.strip()
+
+        fence = FENCE_PATTERN.match(content)
+        if fence:
+            block = {"type": "code", "_text": "", "language": fence.group(1).lower() or None}
+            self.fence = block
+        else:
+            block = parse_line(content)
+
+        return self._attach(indent, block)
+
+    def _attach(self, indent: int, block: dict) -> list:
+        """
+        Put block under the nearest less indented block, or start a new top-level block
+        """
+        emitted = []
+        while self.stack and self.stack[-1][0] >= indent:
+            self.stack.pop()
+        # Juda chuqur qatorlar ikkinchi darajaga qo'yiladi
+        while len(self.stack) > MAX_NESTING_DEPTH:
+            self.stack.pop()
+
+        parent = None
+        while self.stack:
+            candidate = self.stack[-1][1]
+            if (
+                candidate["type"] not in NO_CHILDREN_TYPES
+                and len(candidate.get("children", [])) < MAX_BLOCKS_PER_REQUEST
+            ):
+                parent = candidate
+                break
+            # children qabul qilmaydigan blok ostidagi qator uning qo'shnisi bo'ladi
+            self.stack.pop()
+
+        if parent is None:
+            emitted = self._emit()
+            self.root = block
+            self.stack = [(indent, block)]
+        else:
+            parent.setdefault("children", []).append(block)
+            self.stack.append((indent, block))
+
+        return emitted
+
+
+def compile_markup(text: str) -> list:
+    """
+    Compile whole lesson markup to a list of Notion blocks
+    """
+    parser = MarkupParser()
+    return parser.feed(text) + parser.close()
@@ -1,33 +1,225 @@
-from notion_client import AsyncClient
-from globals import NOTION_TOKEN
+from globals import (
+    NOTION_TOKEN,
+    NOTION_BASE_URL,
+    NOTION_FULL_SYNC_HOURS,
+    NOTION_MAX_CONCURRENCY,
+    NOTION_REQUESTS_PER_SECOND,
+)
 import asyncio
-from database import create_word, word_exists
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from notion_blocks import chunk_blocks
+from telemetry import span
+from database import (
+    delete_words_by_page_ids,
+    delete_words_not_in,
+    get_sync_state,
+    set_sync_state,
+    upsert_notion_words,
+)
+
+VOCABULARY_DATABASE_ID = "18eb8b92-d213-80ee-ae0f-d8a4d0ba4c69"
+
+# vocabulary.db ichidagi sync_state kalitlari
+WATERMARK_KEY = "notion_vocabulary_watermark"
+LAST_FULL_SYNC_KEY = "notion_vocabulary_last_full_sync"
+
+# Qayta yuborsa bo'ladigan javob statuslari
+RETRY_STATUSES = {409, 429, 500, 502, 503, 504}
+# Bu statuslarda so'rov bajarilmagani aniq, qolganlarida bajarilgan bo'lishi mumkin
+NOT_APPLIED_STATUSES = {409, 429, 503}
+# Qayta yuborilsa dublikat yaratadigan so'rovlar
+NON_IDEMPOTENT_METHODS = {"pages.create"}
+
+
+def request_name(request) -> str:
+    """
+    Short name of a Notion client endpoint method, e.g. "pages.create"
+    """
+    owner = getattr(request, "__self__", None)
+    if owner is None:
+        return request.__name__
+    # BlocksChildrenEndpoint -> blocks.children
+    endpoint = re.sub(r"(?<!^)(?=[A-Z])", ".", type(owner).__name__.removesuffix("Endpoint"))
+    return f"{endpoint.lower()}.{request.__name__}"
+
+
+class TokenBucket:
+    """
+    Async token bucket. Allows `rate` requests per second with bursts up to `capacity`
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for the given time (used after 429 responses)
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        # to'ldirish pauza tugagandan keyin boshlanadi, aks holda yana burst bo'ladi
+        self.updated_at = self.paused_until
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NotionScheduler:
+    """
+    Shared scheduler for all Notion requests (reads count against the same
+    rate limit): token bucket rate limit, bounded concurrency and
+    Retry-After aware exponential backoff
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = NOTION_REQUESTS_PER_SECOND,
+        max_concurrency: int = NOTION_MAX_CONCURRENCY,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        self.bucket = TokenBucket(requests_per_second)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _retry_delay(self, error: Exception, attempt: int, idempotent: bool = True):
+        """
+        Return seconds to wait before next attempt, or None if error is not retryable.
+        Non-idempotent requests are retried only when they surely were not applied:
+        after a timeout or 500/502/504 a created page may already exist.
+        """
+        import httpx
+        from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+        if isinstance(error, HTTPResponseError):
+            if error.status not in RETRY_STATUSES:
+                return None
+            if not idempotent and error.status not in NOT_APPLIED_STATUSES:
+                return None
+            retry_after = error.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        elif not isinstance(error, (RequestTimeoutError, httpx.TransportError)):
+            return None
+        elif not idempotent and not isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+            # so'rov serverga yetib borgan bo'lishi mumkin
+            return None
+
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def run(self, request, *args, **kwargs):
+        """
+        Run Notion client request (for example client.pages.create) through the scheduler
+        """
+        method = request_name(request)
+        idempotent = method not in NON_IDEMPOTENT_METHODS
+        with span("notion.request", method=method) as s:
+            attempt = 0
+            while True:
+                async with self.semaphore:
+                    await self.bucket.acquire()
+                    try:
+                        return await request(*args, **kwargs)
+                    except Exception as e:
+                        delay = self._retry_delay(e, attempt, idempotent)
+                        if delay is None or attempt >= self.max_retries:
+                            raise
+                        if getattr(e, "status", None) == 429:
+                            # Limitga yetdik, boshqa so'rovlar ham kutib tursin
+                            self.bucket.pause(delay)
+                            s.count("throttled")
+                        error = e
+
+                attempt += 1
+                s.count("retries")
+                s.count("retry_wait_seconds", delay)
+                print(f"⏳ Notion request failed ({error}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
 
 
 class NotionManager:
     def __init__(self):
-        self.client = AsyncClient(auth=NOTION_TOKEN)
+        from notion_client import AsyncClient
 
-    async def add_vocabulary(self, word: str, translation: str):
+        self.client = AsyncClient(auth=NOTION_TOKEN, base_url=NOTION_BASE_URL)
+        self.scheduler = NotionScheduler()
+
+    async def add_vocabulary(self, word: str, translation: str) -> str:
         """
-        Add new word to vocabulary database with capitalized first letters
+        Add new word to vocabulary database with capitalized first letters.
+        The created page is written to the local database right away, so
+        other jobs see the word before the next sync. Returns page id.
         """
         word = word.strip().capitalize()
         translation = translation.strip().capitalize()
 
-        await self.client.pages.create(
-            parent={"database_id": "18eb8b92-d213-80ee-ae0f-d8a4d0ba4c69"},
+        page = await self.scheduler.run(
+            self.client.pages.create,
+            parent={"database_id": VOCABULARY_DATABASE_ID},
             properties={
                 "Enlish": {"title": [{"text": {"content": word}}]},
                 "O'zbek": {"rich_text": [{"text": {"content": translation}}]},
             },
         )
+        await asyncio.to_thread(upsert_notion_words, [(page["id"], word, translation)])
+        return page["id"]
+
+    async def add_vocabularies(self, words: dict) -> dict:
+        """
+        Add many words concurrently through the scheduler.
+        One failed word does not stop the others.
+
+        Returns:
+            dict: {'added': int, 'failed': {word: error}}
+        """
+        words = list(words.items())
+        results = await asyncio.gather(
+            *(self.add_vocabulary(word, translation) for word, translation in words),
+            return_exceptions=True,
+        )
+
+        failed = {
+            word: str(result)
+            for (word, _), result in zip(words, results)
+            if isinstance(result, Exception)
+        }
+        return {"added": len(words) - len(failed), "failed": failed}
 
     async def create_grammar_page(self, title: str):
         """
         Create new grammar topic page. Return page id
         """
-        new_page = await self.client.pages.create(
+        new_page = await self.scheduler.run(
+            self.client.pages.create,
             parent={"page_id": ""},
             properties={"title": {"title": [{"text": {"content": title}}]}},
         )
@@ -38,8 +230,9 @@ class NotionManager:
         """
         Check if word already exists in vocabulary database
         """
-        response = await self.client.databases.query(
-            database_id="18eb8b92-d213-80ee-ae0f-d8a4d0ba4c69",
+        response = await self.scheduler.run(
+            self.client.databases.query,
+            database_id=VOCABULARY_DATABASE_ID,
             filter={"property": "Word", "title": {"equals": word}},
         )
         return len(response["results"]) > 0
@@ -48,7 +241,8 @@ class NotionManager:
         """
         Get all pages from vocabulary database
         """
-        response = await self.client.search(
+        response = await self.scheduler.run(
+            self.client.search,
             query="",
         )
         return response["results"]
@@ -57,61 +251,109 @@ class NotionManager:
         """
         Get dictionary database
         """
-        response = await self.client.databases.query(
-            database_id="18eb8b92-d213-80ee-ae0f-d8a4d0ba4c69",
+        response = await self.scheduler.run(
+            self.client.databases.query,
+            database_id=VOCABULARY_DATABASE_ID,
         )
         return response["results"][0]
 
-    async def get_all_words_and_update_database(self):
+    async def query_vocabulary_pages(self, edited_since: str = None):
         """
-        Get all words from vocabulary database and update database with capitalized first letters
+        Yield every page of the vocabulary database, following next_cursor.
+        If edited_since is given, only pages edited on or after it are returned.
         """
-        response = await self.client.databases.query(
-            database_id="18eb8b92-d213-80ee-ae0f-d8a4d0ba4c69",
-        )
+        query = {"database_id": VOCABULARY_DATABASE_ID, "page_size": 100}
+        if edited_since:
+            query["filter"] = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": edited_since},
+            }
+
+        while True:
+            response = await self.scheduler.run(self.client.databases.query, **query)
+            for page in response["results"]:
+                yield page
+
+            if not response.get("has_more"):
+                break
+            query["start_cursor"] = response["next_cursor"]
+
+    def _full_sync_due(self, watermark: str, last_full_sync: str) -> bool:
+        if not watermark or not last_full_sync:
+            return True
+        return datetime.now(timezone.utc) - datetime.fromisoformat(
+            last_full_sync
+        ) >= timedelta(hours=NOTION_FULL_SYNC_HOURS)
+
+    async def get_all_words_and_update_database(self, full: bool = None):
+        """
+        Sync vocabulary database from Notion to local database.
 
-        saved_words = 0
-        skipped_words = 0
+        Incremental sync only asks Notion for pages edited since the stored
+        last_edited_time watermark. Notion does not return deleted pages, so a
+        full sync runs when there is no watermark yet, every NOTION_FULL_SYNC_HOURS,
+        or when full=True, and removes local words whose pages are gone.
+        """
+        # SQLite so'rovlari event loopni bloklamasligi uchun threadda bajariladi
+        watermark = await asyncio.to_thread(get_sync_state, WATERMARK_KEY)
+        if full is None:
+            last_full_sync = await asyncio.to_thread(get_sync_state, LAST_FULL_SYNC_KEY)
+            full = self._full_sync_due(watermark, last_full_sync)
+        if full:
+            watermark = None
+        sync_started_at = datetime.now(timezone.utc).isoformat()
+
+        rows = []
+        empty_page_ids = []
+        seen_page_ids = set()
+        new_watermark = watermark
+
+        async for page in self.query_vocabulary_pages(edited_since=watermark):
+            seen_page_ids.add(page["id"])
+            if new_watermark is None or page["last_edited_time"] > new_watermark:
+                new_watermark = page["last_edited_time"]
 
-        for page in response["results"]:
             try:
                 # Extract English and Uzbek words from Notion page
-                english_word = (
-                    page["properties"]["Enlish"]["title"][0]["text"]["content"]
-                    .strip()
-                    .capitalize()
-                )
-                uzbek_word = (
-                    page["properties"]["O'zbek"]["rich_text"][0]["text"]["content"]
-                    .strip()
-                    .capitalize()
-                )
-
-                # Check if word already exists in database
-                if not word_exists(english_word):
-                    # Create new word in database
-                    word = create_word(english=english_word, uzbek=uzbek_word)
-                    if word:
-                        saved_words += 1
-                else:
-                    skipped_words += 1
-
-            except (KeyError, IndexError) as e:
-                print(f"Error processing page: {e}")
-                continue
+                english_word = page["properties"]["Enlish"]["title"][0]["text"][
+                    "content"
+                ].strip()
+                uzbek_word = page["properties"]["O'zbek"]["rich_text"][0]["text"][
+                    "content"
+                ].strip()
+            except (KeyError, IndexError):
+                english_word = uzbek_word = ""
+
+            if english_word and uzbek_word:
+                rows.append((page["id"], english_word, uzbek_word))
+            else:
+                # So'zi o'chirilgan sahifa lokal bazada ham qolmasligi kerak
+                empty_page_ids.append(page["id"])
+
+        synced_words = await asyncio.to_thread(upsert_notion_words, rows)
+        deleted_words = await asyncio.to_thread(delete_words_by_page_ids, empty_page_ids)
+        if full:
+            deleted_words += await asyncio.to_thread(
+                delete_words_not_in, [page_id for page_id, _, _ in rows]
+            )
+            await asyncio.to_thread(set_sync_state, LAST_FULL_SYNC_KEY, sync_started_at)
+        if new_watermark:
+            await asyncio.to_thread(set_sync_state, WATERMARK_KEY, new_watermark)
 
         return {
-            "saved_words": saved_words,
-            "skipped_words": skipped_words,
-            "total_processed": saved_words + skipped_words,
+            "full_sync": full,
+            "synced_words": synced_words,
+            "deleted_words": deleted_words,
+            "total_processed": len(seen_page_ids),
         }
 
     async def get_all_lesson_pages(self):
         """
         Get all lesson pages with their titles and IDs
         """
-        response = await self.client.blocks.children.list(
-            block_id="18eb8b92-d213-8024-ab92-ee904d792d47"
+        response = await self.scheduler.run(
+            self.client.blocks.children.list,
+            block_id="18eb8b92-d213-8024-ab92-ee904d792d47",
         )
 
         lesson_pages = []
@@ -127,7 +369,8 @@ class NotionManager:
         """
         Create a new lesson page
         """
-        new_page = await self.client.pages.create(
+        new_page = await self.scheduler.run(
+            self.client.pages.create,
             parent={"page_id": "18eb8b92-d213-8024-ab92-ee904d792d47"},
             properties={"title": {"title": [{"text": {"content": title}}]}},
         )
@@ -137,7 +380,8 @@ class NotionManager:
         """
         Create a new grammar page with content
         """
-        response = await self.client.blocks.children.append(
+        response = await self.scheduler.run(
+            self.client.blocks.children.append,
             block_id=page_id,
             children=children,
         )
@@ -145,13 +389,80 @@ class NotionManager:
 
     async def update_children_in_the_page(self, page_id: str, children: list):
         """
-        Update children in the page
+        Append children to the page. Blocks are split into batches that fit
+        Notion request limits and sent in order. Returns list of responses.
         """
-        response = await self.client.blocks.children.append(
-            block_id=page_id,
-            children=children,
+        responses = []
+        for batch in chunk_blocks(children):
+            responses.append(
+                await self.scheduler.run(
+                    self.client.blocks.children.append,
+                    block_id=page_id,
+                    children=batch,
+                )
+            )
+        return responses
+
+    async def append_block_stream(self, page_id: str, blocks, on_batch=None) -> int:
+        """
+        Append blocks from an async iterator while it is still producing them.
+        Blocks that arrive while a request is in flight go into the next
+        request, so the first block is visible after one round trip and later
+        requests get bigger on their own. Returns number of appended blocks.
+
+        Args:
+            blocks: Async iterator of Notion blocks
+            on_batch: async callback(list of appended block ids) called after every request
+        """
+        pending = []
+        arrived = asyncio.Event()
+        done = False
+
+        async def read():
+            nonlocal done
+            try:
+                async for block in blocks:
+                    pending.append(block)
+                    arrived.set()
+            finally:
+                done = True
+                arrived.set()
+
+        reader = asyncio.create_task(read())
+        appended = 0
+        try:
+            while True:
+                if not pending and not done:
+                    await arrived.wait()
+                    arrived.clear()
+                if pending:
+                    ready = pending[:]
+                    pending.clear()
+                    for batch in chunk_blocks(ready):
+                        response = await self.scheduler.run(
+                            self.client.blocks.children.append,
+                            block_id=page_id,
+                            children=batch,
+                        )
+                        appended += len(batch)
+                        if on_batch:
+                            await on_batch([block["id"] for block in response["results"]])
+                    continue
+                if done:
+                    break
+            # generator xatosini yuqoriga chiqarish
+            await reader
+        finally:
+            reader.cancel()
+        return appended
+
+    async def delete_blocks(self, block_ids: list):
+        """
+        Delete (archive) blocks, for example a partly appended lesson before it is regenerated
+        """
+        await asyncio.gather(
+            *(self.scheduler.run(self.client.blocks.delete, block_id=block_id) for block_id in block_ids)
         )
-        return response
 
 
 # async def main():
@@ -160,8 +471,8 @@ class NotionManager:
 #     # Sync words from Notion to local database
 #     result = await notion_manager.get_all_words_and_update_database()
 #     print(f"Sync results:")
-#     print(f"- Saved new words: {result['saved_words']}")
-#     print(f"- Skipped existing words: {result['skipped_words']}")
+#     print(f"- Synced words: {result['synced_words']}")
+#     print(f"- Deleted words: {result['deleted_words']}")
 #     print(f"- Total processed: {result['total_processed']}")
 
 
@@ -0,0 +1,119 @@
+import copy
+import json
+
+# Notion API limitlari
+MAX_BLOCKS_PER_REQUEST = 100
+MAX_BLOCK_ELEMENTS_PER_REQUEST = 1000
+MAX_PAYLOAD_BYTES = 500_000
+MAX_RICH_TEXT_LENGTH = 2000
+MAX_RICH_TEXT_ITEMS = 100
+
+# Payload hisobiga so'rovning qolgan qismi uchun zaxira
+PAYLOAD_RESERVE_BYTES = 10_000
+
+
+def split_rich_text(rich_text: list) -> list:
+    """
+    Split rich_text items whose content is longer than Notion allows.
+    Annotations and links are copied to every part.
+    """
+    result = []
+    for item in rich_text:
+        content = item.get("text", {}).get("content")
+        if content is None or len(content) <= MAX_RICH_TEXT_LENGTH:
+            result.append(item)
+            continue
+
+        for start in range(0, len(content), MAX_RICH_TEXT_LENGTH):
+            part = copy.deepcopy(item)
+            part["text"]["content"] = content[start : start + MAX_RICH_TEXT_LENGTH]
+            if "plain_text" in part:
+                part["plain_text"] = part["text"]["content"]
+            result.append(part)
+    return result
+
+
+def prepare_block(block: dict) -> list:
+    """
+    Make block fit Notion limits. Returns one or more blocks: if rich_text has
+    too many items, the rest is moved into continuation blocks of the same type.
+    """
+    block_type = block.get("type")
+    body = block.get(block_type)
+    if not isinstance(body, dict):
+        return [block]
+
+    block = copy.copy(block)
+    body = copy.copy(body)
+    block[block_type] = body
+
+    if "children" in body:
+        body["children"] = prepare_blocks(body["children"])
+
+    if "rich_text" not in body:
+        return [block]
+
+    rich_text = split_rich_text(body["rich_text"])
+    body["rich_text"] = rich_text[:MAX_RICH_TEXT_ITEMS]
+    blocks = [block]
+    for start in range(MAX_RICH_TEXT_ITEMS, len(rich_text), MAX_RICH_TEXT_ITEMS):
+        blocks.append(
+            {
+                "object": "block",
+                "type": block_type,
+                block_type: {
+                    # code.language, callout.icon kabi maydonlar ham kerak
+                    **{key: value for key, value in body.items() if key not in ("rich_text", "children")},
+                    "rich_text": rich_text[start : start + MAX_RICH_TEXT_ITEMS],
+                },
+            }
+        )
+    return blocks
+
+
+def prepare_blocks(blocks: list) -> list:
+    """
+    Apply prepare_block to every block
+    """
+    result = []
+    for block in blocks:
+        result.extend(prepare_block(block))
+    return result
+
+
+def count_elements(block: dict) -> int:
+    """
+    Count block and all its nested children
+    """
+    body = block.get(block.get("type"))
+    children = body.get("children", []) if isinstance(body, dict) else []
+    return 1 + sum(count_elements(child) for child in children)
+
+
+def chunk_blocks(blocks: list):
+    """
+    Yield batches of prepared blocks that fit into one blocks.children.append request:
+    at most 100 top-level blocks, 1000 block elements and ~500KB payload.
+    """
+    batch = []
+    batch_elements = 0
+    batch_bytes = 0
+    payload_limit = MAX_PAYLOAD_BYTES - PAYLOAD_RESERVE_BYTES
+
+    for block in prepare_blocks(blocks):
+        elements = count_elements(block)
+        size = len(json.dumps(block, ensure_ascii=False).encode("utf-8"))
+        if batch and (
+            len(batch) >= MAX_BLOCKS_PER_REQUEST
+            or batch_elements + elements > MAX_BLOCK_ELEMENTS_PER_REQUEST
+            or batch_bytes + size > payload_limit
+        ):
+            yield batch
+            batch, batch_elements, batch_bytes = [], 0, 0
+
+        batch.append(block)
+        batch_elements += elements
+        batch_bytes += size
+
+    if batch:
+        yield batch
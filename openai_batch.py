@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import time
+from database import get_sync_state, set_sync_state
+from telemetry import span
+from globals import OPENAI_BATCH_DIR, OPENAI_BATCH_MAX_REQUESTS, OPENAI_BATCH_POLL_SECONDS
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Bu holatlardan keyin batch o'zgarmaydi
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def write_batch_file(requests: dict, directory: str = OPENAI_BATCH_DIR) -> str:
+    """
+    Write chat completion requests as a Batch API input file, one JSON line
+    per request. File name is a hash of the content, so the same requests
+    always give the same file.
+
+    Args:
+        requests (dict): {custom_id: chat completion params}
+
+    Returns:
+        str: Path of the JSONL file
+    """
+    lines = [
+        json.dumps(
+            {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": params},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        for custom_id, params in requests.items()
+    ]
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{hashlib.sha256(data).hexdigest()[:16]}.jsonl")
+    if not os.path.exists(path):
+        with open(path, "wb") as batch_file:
+            batch_file.write(data)
+    return path
+
+
+class OpenAIBatch:
+    """
+    Runs chat completion requests through the OpenAI Batch API: upload JSONL
+    file, create batch, poll until it is finished and read output files.
+    Batch id of every input file is kept in sync_state, so a process that
+    was stopped while waiting, or before its answers were saved, picks up
+    the same batch instead of paying for a new one. Requests of a finished
+    batch that got no answer are sent again in a new file.
+    """
+
+    def __init__(
+        self,
+        client,
+        poll_seconds: float = OPENAI_BATCH_POLL_SECONDS,
+        completion_window: str = "24h",
+        max_requests: int = OPENAI_BATCH_MAX_REQUESTS,
+    ):
+        """
+        Args:
+            client: openai.OpenAI client
+            poll_seconds (float): Pause between status checks
+            max_requests (int): Requests per input file, the API allows 50 000
+        """
+        self.client = client
+        self.poll_seconds = poll_seconds
+        self.completion_window = completion_window
+        self.max_requests = max_requests
+
+    def submit(self, path: str) -> str:
+        """
+        Upload input file and create a batch, or return the batch already
+        created for it. A finished batch is created again only when it has
+        no answers at all; otherwise its output is read and run() sends the
+        unanswered requests in a new file.
+        """
+        state_key = f"openai_batch:{os.path.basename(path)}"
+        batch_id = get_sync_state(state_key)
+        if batch_id:
+            batch = self.client.batches.retrieve(batch_id)
+            answered = batch.request_counts.completed if batch.request_counts else 0
+            if batch.status not in FINAL_STATUSES or answered:
+                print(f"♻️ Reusing batch {batch_id} ({batch.status})")
+                return batch_id
+
+        with span("openai.batch.submit") as s, open(path, "rb") as batch_file:
+            s.count("bytes", os.path.getsize(path))
+            uploaded = self.client.files.create(file=batch_file, purpose="batch")
+            batch = self.client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window,
+                metadata={"file": os.path.basename(path)},
+            )
+            s.set("batch_id", batch.id)
+        set_sync_state(state_key, batch.id)
+        print(f"📦 Submitted batch {batch.id} ({os.path.basename(path)})")
+        return batch.id
+
+    def wait(self, batch_id: str):
+        """
+        Poll batch until it reaches a final status
+
+        Returns:
+            openai.types.Batch
+        """
+        with span("openai.batch.wait") as s:
+            s.set("batch_id", batch_id)
+            while True:
+                batch = self.client.batches.retrieve(batch_id)
+                s.count("polls")
+                if batch.status in FINAL_STATUSES:
+                    s.set("status", batch.status)
+                    return batch
+                counts = batch.request_counts
+                if counts:
+                    print(f"⏳ Batch {batch_id}: {batch.status}, {counts.completed}/{counts.total}")
+                time.sleep(self.poll_seconds)
+
+    def read_results(self, batch) -> tuple:
+        """
+        Read output and error files of a finished batch
+
+        Returns:
+            tuple: ({custom_id: response body}, {custom_id: error message})
+        """
+        results, errors = {}, {}
+        with span("openai.batch.results") as s:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                content = self.client.files.content(file_id).text
+                s.count("bytes", len(content.encode("utf-8")))
+                for line in content.splitlines():
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    response = item.get("response") or {}
+                    if item.get("error") or response.get("status_code") != 200:
+                        error = item.get("error") or response.get("body", {}).get("error") or {}
+                        errors[item["custom_id"]] = error.get("message") or f"HTTP {response.get('status_code')}"
+                        continue
+                    body = response["body"]
+                    usage = body.get("usage") or {}
+                    s.count("prompt_tokens", usage.get("prompt_tokens", 0))
+                    s.count("completion_tokens", usage.get("completion_tokens", 0))
+                    results[item["custom_id"]] = body
+        return results, errors
+
+    def run(self, requests: dict) -> tuple:
+        """
+        Send requests in as few batches as the API allows and wait for all of
+        them. Unanswered requests of a batch that answered the others are sent
+        again in a new, smaller file until a batch answers none of them.
+
+        Args:
+            requests (dict): {custom_id: chat completion params}
+
+        Returns:
+            tuple: ({custom_id: response body}, {custom_id: error message})
+        """
+        results, errors = {}, {}
+        pending = requests
+        while pending:
+            items = list(pending.items())
+            batches = []
+            for start in range(0, len(items), self.max_requests):
+                part = dict(items[start : start + self.max_requests])
+                batches.append((self.submit(write_batch_file(part)), part))
+
+            pending = {}
+            for batch_id, part in batches:
+                batch = self.wait(batch_id)
+                batch_results, batch_errors = self.read_results(batch)
+                results.update(batch_results)
+                errors.update(batch_errors)
+                if batch.status != "completed":
+                    message = f"Batch {batch_id} {batch.status}"
+                    if batch.errors and batch.errors.data:
+                        message += f": {batch.errors.data[0].message}"
+                    for custom_id in part:
+                        if custom_id not in results:
+                            errors.setdefault(custom_id, message)
+                missing = {custom_id: params for custom_id, params in part.items() if custom_id not in results}
+                # Fayl har safar kichrayadi, hech narsa javob bermasa to'xtaydi
+                if batch_results and missing:
+                    print(f"🔁 Resending {len(missing)} unanswered requests of batch {batch_id}")
+                    pending.update(missing)
+        # Javobsiz qolgan so'rovlar ham xato hisoblanadi
+        for custom_id in requests:
+            if custom_id not in results:
+                errors.setdefault(custom_id, "No result in batch output")
+        # qayta yuborilganda javob olganlar xato emas
+        errors = {custom_id: error for custom_id, error in errors.items() if custom_id not in results}
+        return results, errors
@@ -1,23 +1,125 @@
-from PyPDF2 import PdfReader, PdfWriter
-from pdf2image import convert_from_path
+# PyPDF2 va pdf2image birinchi kerak bo'lganda import qilinadi (tez ishga tushish uchun)
+from dataclasses import dataclass
+import hashlib
 import io
+import os
+import threading
+from cache import PageCache, get_page_cache
+from telemetry import increment, span
+
+
+@dataclass(frozen=True)
+class RenderSettings:
+    """
+    Page rendering options. Default size matches what gpt-4o uses for
+    high detail images: shortest side 768px, longest side at most 2048px.
+    """
+
+    dpi: int = 100
+    format: str = "JPEG"
+    quality: int = 80
+    max_short_side: int = 768
+    max_long_side: int = 2048
+    thread_count: int = os.cpu_count() or 1
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Page cache kind for images rendered with these settings (thread_count does not change the result)
+        """
+        return (
+            f"image:{self.dpi}:{self.format.upper()}:{self.quality}:"
+            f"{self.max_short_side}:{self.max_long_side}"
+        )
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+    def fit(self, image):
+        """
+        Shrink PIL image to the configured max dimensions keeping aspect ratio
+        """
+        short_side, long_side = sorted(image.size)
+        scale = min(1.0, self.max_short_side / short_side, self.max_long_side / long_side)
+        if scale < 1.0:
+            image = image.resize(
+                (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            )
+        return image
+
+    def encode(self, image) -> bytes:
+        image = self.fit(image)
+        if self.format.upper() == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        if self.format.upper() == "JPEG":
+            image.save(output, format="JPEG", quality=self.quality, optimize=True)
+        else:
+            image.save(output, format=self.format, optimize=True)
+        return output.getvalue()
 
 
 class PDFProcessor:
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, page_cache: PageCache = None):
+        from PyPDF2 import PdfReader
+
         self.pdf_path = pdf_path
         self.reader = PdfReader(pdf_path)
+        self.page_cache = page_cache or get_page_cache()
+        self._content_hash = None
+        # PdfReader thread-safe emas
+        self.lock = threading.Lock()
+
+    @property
+    def content_hash(self) -> str:
+        """
+        SHA-256 of the PDF file, used as page cache key
+        """
+        if self._content_hash is None:
+            digest = hashlib.sha256()
+            with open(self.pdf_path, "rb") as pdf_file:
+                for chunk in iter(lambda: pdf_file.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def iter_page_texts(self, start_page: int, end_page: int):
+        """
+        Yield (page_number, text) for every page in range, one page at a time.
+        Pages seen before come from the page cache.
+        """
+        page_numbers = range(start_page, min(end_page, len(self.reader.pages)) + 1)
+        cached = self.page_cache.get_many(self.content_hash, "text", page_numbers)
+
+        increment("page_cache_hits_total", len(cached), kind="text")
+        for page_number in page_numbers:
+            if page_number in cached:
+                yield page_number, cached[page_number].decode("utf-8")
+                continue
+
+            with span("pdf.extract_text") as s, self.lock:
+                text = self.reader.pages[page_number - 1].extract_text()
+                s.set("page", page_number)
+                s.count("bytes", len(text.encode("utf-8")))
+            self.page_cache.set(self.content_hash, "text", page_number, text.encode("utf-8"))
+            yield page_number, text
+
+    def extract_page_texts(self, start_page: int, end_page: int) -> dict:
+        """
+        Extract text of every page in range
+
+        Returns:
+            dict: {page_number: text}
+        """
+        return dict(self.iter_page_texts(start_page, end_page))
 
     def extract_text_from_pages(self, start_page: int, end_page: int) -> str:
         """
         Extract text from specified page range
         """
-        text = ""
-        for page_num in range(start_page - 1, end_page):
-            if page_num < len(self.reader.pages):
-                page = self.reader.pages[page_num]
-                text += page.extract_text()
-        return text
+        return "".join(self.extract_page_texts(start_page, end_page).values())
 
     def get_total_pages(self) -> int:
         """
@@ -25,15 +127,23 @@ class PDFProcessor:
         """
         return len(self.reader.pages)
 
-    def convert_pdf_to_images(self) -> list:
+    def convert_pdf_to_images(self, first_page: int = None, last_page: int = None) -> list:
         """
         PDF faylni rasmlar ro'yxatiga o'tkazish
         
+        Args:
+            first_page (int): Birinchi sahifa (1 dan boshlanadi), berilmasa butun fayl
+            last_page (int): Oxirgi sahifa
+        
         Returns:
             list: PNG formatidagi rasmlar ro'yxati (bytes)
         """
+        from pdf2image import convert_from_path
+
         # PDF faylni rasmlarga o'tkazish
-        images = convert_from_path(self.pdf_path)
+        images = convert_from_path(
+            self.pdf_path, first_page=first_page, last_page=last_page
+        )
         
         # Har bir rasmni PNG formatiga o'tkazish
         png_images = []
@@ -44,11 +154,88 @@ class PDFProcessor:
             
         return png_images
 
+    def render_pages(self, first_page: int, last_page: int, settings: RenderSettings = None):
+        """
+        Render pages in parallel poppler batches and yield them one by one.
+        Pages already in the page cache are not rendered again, and only one
+        batch (thread_count pages) of images is kept in memory at a time.
+
+        Yields:
+            tuple: (page number, encoded image bytes)
+        """
+        settings = settings or RenderSettings()
+        cached = self.page_cache.get_many(
+            self.content_hash, settings.cache_key, range(first_page, last_page + 1)
+        )
+        increment("page_cache_hits_total", len(cached), kind="image")
+
+        page_number = first_page
+        while page_number <= last_page:
+            if page_number in cached:
+                yield page_number, cached.pop(page_number)
+                page_number += 1
+                continue
+
+            # Keshda yo'q ketma-ket sahifalarni bitta batchda render qilish
+            batch_end = page_number
+            while (
+                batch_end < last_page
+                and batch_end - page_number + 1 < max(1, settings.thread_count)
+                and batch_end + 1 not in cached
+            ):
+                batch_end += 1
+
+            for rendered_page, image in self._render_batch(page_number, batch_end, settings):
+                self.page_cache.set(self.content_hash, settings.cache_key, rendered_page, image)
+                yield rendered_page, image
+            page_number = batch_end + 1
+
+    def render_page_numbers(self, page_numbers, settings: RenderSettings = None):
+        """
+        Render only the given pages (for example pages without a usable text layer)
+
+        Yields:
+            tuple: (page number, encoded image bytes)
+        """
+        page_numbers = sorted(set(page_numbers))
+        run_start = 0
+        for index in range(1, len(page_numbers) + 1):
+            # Ketma-ket sahifalar bitta render_pages chaqiruvida ishlanadi
+            if index == len(page_numbers) or page_numbers[index] != page_numbers[index - 1] + 1:
+                yield from self.render_pages(
+                    page_numbers[run_start], page_numbers[index - 1], settings
+                )
+                run_start = index
+
+    def _render_batch(self, first_page: int, last_page: int, settings: RenderSettings):
+        from pdf2image import convert_from_path
+
+        with span("pdf.render", dpi=settings.dpi) as s:
+            s.set("page_range", f"{first_page}-{last_page}")
+            s.count("pages", last_page - first_page + 1)
+            images = convert_from_path(
+                self.pdf_path,
+                dpi=settings.dpi,
+                first_page=first_page,
+                last_page=last_page,
+                thread_count=last_page - first_page + 1,
+            )
+        for offset in range(len(images)):
+            image = images[offset]
+            # yield qilishdan oldin PIL rasmni xotiradan chiqarish
+            images[offset] = None
+            with span("pdf.encode", format=settings.format.upper()) as s:
+                encoded = settings.encode(image)
+                s.count("bytes", len(encoded))
+            yield first_page + offset, encoded
+
     def extract_pages(self, start_page: int, end_page: int) -> str:
         """
         Yuklangan pdf ichidan berilgan sahifalar yordamida yangi pdf fayl yaratish
         va yangi yaratilgan pdf fayl nomini qaytarish
         """
+        from PyPDF2 import PdfWriter
+
         # Create a new PDF writer
         new_pdf_writer = PdfWriter()
 
@@ -65,6 +252,65 @@ class PDFProcessor:
 
         return new_pdf_path
 
+    def page_range(self, start_page: int, end_page: int) -> "PageRange":
+        """
+        Sahifalar oralig'i uchun yangi fayl yaratmasdan view qaytarish
+        """
+        with span("pdf.slice") as s:
+            s.set("page_range", f"{start_page}-{end_page}")
+            return PageRange(self, start_page, end_page)
+
+
+class PageRange:
+    """
+    View over pages start_page..end_page (1-based, inclusive) of an open book
+    """
+
+    def __init__(self, book: PDFProcessor, start_page: int, end_page: int):
+        total_pages = book.get_total_pages()
+        if start_page < 1 or start_page > end_page or start_page > total_pages:
+            raise ValueError(
+                f"Invalid page range {start_page}-{end_page} for {total_pages} pages"
+            )
+
+        self.book = book
+        self.start_page = start_page
+        self.end_page = min(end_page, total_pages)
+
+    @property
+    def page_numbers(self) -> range:
+        return range(self.start_page, self.end_page + 1)
+
+    def iter_page_texts(self):
+        return self.book.iter_page_texts(self.start_page, self.end_page)
+
+    def render(self, settings: RenderSettings = None):
+        """
+        Generator of (page number, encoded image) for every page in the range
+        """
+        return self.book.render_pages(self.start_page, self.end_page, settings)
+
+    def __repr__(self):
+        return f"<PageRange({self.book.pdf_path}, {self.start_page}-{self.end_page})>"
+
+
+_books = {}
+_books_lock = threading.Lock()
+
+
+def open_book(pdf_path: str) -> PDFProcessor:
+    """
+    Return process-wide PDFProcessor for the book, parsing the file only once
+    """
+    path = os.path.abspath(pdf_path)
+    with _books_lock:
+        if path not in _books:
+            with span("pdf.open") as s:
+                s.set("path", path)
+                s.count("bytes", os.path.getsize(path))
+                _books[path] = PDFProcessor(path)
+        return _books[path]
+
 
 # Example testing
 # if __name__ == "__main__":
@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from globals import TELEMETRY_LOG_PATH, METRICS_PATH
+
+# Span davomiyligi uchun histogram chegaralari (sekund)
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+logger = logging.getLogger("telemetry")
+logger.propagate = False
+_logger_configured = False
+
+_current_span = ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+
+
+def _log(record: dict):
+    """
+    Write span record as a JSON line. Log file is opened on the first record.
+    """
+    global _logger_configured
+    if not _logger_configured:
+        with _lock:
+            if not _logger_configured and TELEMETRY_LOG_PATH:
+                handler = logging.FileHandler(TELEMETRY_LOG_PATH, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+            _logger_configured = True
+    if logger.handlers:
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels):
+    """
+    Add value to a counter
+    """
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Record value in a histogram
+    """
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.setdefault(
+            key, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+        )
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+class Span:
+    """
+    One timed operation. Labels become metric labels (keep them low-cardinality),
+    attributes only go to the JSON log, counts are summed into counters.
+    Counts of child spans are also added to `totals` of every parent, so the
+    log line of a pipeline span shows tokens and bytes used by the whole unit.
+    """
+
+    def __init__(self, name: str, labels: dict, parent=None):
+        self.name = name
+        self.labels = labels
+        self.parent = parent
+        self.attributes = {}
+        self.counts = defaultdict(float)
+        self.totals = defaultdict(float)
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.status = "ok"
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def count(self, key: str, value: float = 1):
+        """
+        Add to a numeric measurement such as tokens, bytes or retries
+        """
+        self.counts[key] += value
+
+
+def _rounded(counts: dict) -> dict:
+    return {key: round(value, 6) for key, value in counts.items()}
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    Time a block of code, record metrics and write a JSON log line.
+    Works in sync code, threads and coroutines.
+
+        with span("openai.chat", model="gpt-4o") as s:
+            s.count("prompt_tokens", 120)
+    """
+    parent = _current_span.get()
+    current = Span(name, labels, parent)
+    token = _current_span.set(current)
+    started_at = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.status = "error"
+        current.set("error", f"{type(e).__name__}: {e}")
+        raise
+    except BaseException:
+        # asyncio.CancelledError, KeyboardInterrupt
+        current.status = "cancelled"
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # span boshqa contextda yopildi (masalan generator boshqa threadda davom etdi)
+            _current_span.set(parent)
+        duration = time.perf_counter() - started_at
+        increment("span_total", span=name, status=current.status, **labels)
+        observe("span_duration_seconds", duration, span=name, **labels)
+        for key, value in current.counts.items():
+            increment(f"{key}_total", value, span=name, **labels)
+
+        with _lock:
+            for key, value in current.counts.items():
+                current.totals[key] += value
+            ancestor = parent
+            while ancestor is not None:
+                for key, value in current.counts.items():
+                    ancestor.totals[key] += value
+                ancestor = ancestor.parent
+
+        _log(
+            {
+                "ts": time.time(),
+                "span": name,
+                "trace_id": current.trace_id,
+                "span_id": current.span_id,
+                "parent_id": current.parent_id,
+                "status": current.status,
+                "duration": round(duration, 6),
+                **labels,
+                **current.attributes,
+                **_rounded(current.counts),
+                **({"totals": _rounded(current.totals)} if current.totals != current.counts else {}),
+            }
+        )
+
+
+def _format_labels(labels: tuple, extra: dict = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def export_prometheus() -> str:
+    """
+    All metrics in Prometheus text exposition format
+    """
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+
+    typed = set()
+    for (name, labels), value in counters:
+        metric = f"english_agent_{name.replace('.', '_')}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+
+    for (name, labels), histogram in histograms:
+        metric = f"english_agent_{name}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+            lines.append(f"{metric}_bucket{_format_labels(labels, {'le': bound})} {count}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, {'le': '+Inf'})} {histogram['count']}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str = METRICS_PATH):
+    """
+    Write metrics file (for node_exporter textfile collector or manual checks)
+    """
+    if not path:
+        return
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(export_prometheus())
+    # Prometheus yarim yozilgan faylni o'qimasligi uchun
+    os.replace(temp_path, path)
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serve /metrics over HTTP in a background thread
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = export_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modullar repo ildizida joylashgan
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,217 @@
+import pytest
+from lesson_markup import MAX_NESTING_DEPTH, MarkupParser, compile_markup, parse_inline
+from notion_blocks import MAX_BLOCKS_PER_REQUEST, MAX_RICH_TEXT_LENGTH
+
+LESSON = """# Present Simple
+Intro with **bold**, *italic*, `code` and [a link](https://example.com).
+A second paragraph.
+
+## Rules
+- I **work**
+  - he work*s*
+    - deeper line
+1. First
+2) Second
+[ ] Do exercise 1
+[x] Read the rule
+> There is a cat.
+!> 📌 Remember the -s.
+!> No emoji here
++ Answers
+  1. works
+  2. goes
+---
+```python
+print("hi")
+
+print("bye")
+```
+### Common mistakes
+"""
+
+
+def text(block: dict) -> str:
+    return "".join(item["text"]["content"] for item in block[block["type"]]["rich_text"])
+
+
+def children(block: dict) -> list:
+    return block[block["type"]].get("children", [])
+
+
+@pytest.mark.parametrize(
+    "line, block_type",
+    [
+        ("# Title", "heading_1"),
+        ("## Title", "heading_2"),
+        ("### Title", "heading_3"),
+        ("- Title", "bulleted_list_item"),
+        ("* Title", "bulleted_list_item"),
+        ("1. Title", "numbered_list_item"),
+        ("2) Title", "numbered_list_item"),
+        ("> Title", "quote"),
+        ("+ Title", "toggle"),
+        ("Title", "paragraph"),
+    ],
+)
+def test_line_types(line, block_type):
+    (block,) = compile_markup(line)
+    assert block["type"] == block_type
+    assert text(block) == "Title"
+
+
+def test_to_do():
+    unchecked, checked = compile_markup("[ ] Open book\n[x] Read text")
+    assert unchecked["to_do"]["checked"] is False
+    assert checked["to_do"]["checked"] is True
+    assert text(unchecked) == "Open book"
+    assert text(checked) == "Read text"
+
+
+def test_callout_icon():
+    with_emoji, without_emoji = compile_markup("!> 📌 Remember\n!> Plain note")
+    assert with_emoji["callout"]["icon"] == {"type": "emoji", "emoji": "📌"}
+    assert text(with_emoji) == "Remember"
+    assert without_emoji["callout"]["icon"] == {"type": "emoji", "emoji": "💡"}
+    assert text(without_emoji) == "Plain note"
+
+
+def test_divider():
+    assert compile_markup("---") == [{"object": "block", "type": "divider", "divider": {}}]
+
+
+def test_code_fence_keeps_lines():
+    (block,) = compile_markup('```python\nx = 1\n\n# not a heading\n```')
+    assert block["type"] == "code"
+    assert block["code"]["language"] == "python"
+    assert text(block) == "x = 1\n\n# not a heading"
+
+
+def test_code_fence_unknown_language():
+    (block,) = compile_markup("```brainfuck\n+\n```")
+    assert block["code"]["language"] == "plain text"
+
+
+def test_plain_line_after_text_block_is_paragraph():
+    bullet, paragraph = compile_markup("- He works\nThe -s ending is added")
+    assert text(bullet) == "He works"
+    assert "children" not in bullet["bulleted_list_item"]
+    assert paragraph["type"] == "paragraph"
+    assert text(paragraph) == "The -s ending is added"
+
+    callout, paragraph = compile_markup("!> 💡 Note\nNext paragraph")
+    assert text(callout) == "Note"
+    assert text(paragraph) == "Next paragraph"
+
+
+def test_indented_plain_line_is_child_paragraph():
+    (bullet,) = compile_markup("- He works\n  The -s ending is added")
+    (child,) = children(bullet)
+    assert child["type"] == "paragraph"
+    assert text(child) == "The -s ending is added"
+
+
+def test_inline_formatting():
+    items = parse_inline("a **bold** b *italic* `x()` [link](https://example.com) _it_")
+    assert items == [
+        {"type": "text", "text": {"content": "a "}},
+        {"type": "text", "text": {"content": "bold"}, "annotations": {"bold": True}},
+        {"type": "text", "text": {"content": " b "}},
+        {"type": "text", "text": {"content": "italic"}, "annotations": {"italic": True}},
+        {"type": "text", "text": {"content": " "}},
+        {"type": "text", "text": {"content": "x()"}, "annotations": {"code": True}},
+        {"type": "text", "text": {"content": " "}},
+        {"type": "text", "text": {"content": "link", "link": {"url": "https://example.com"}}},
+        {"type": "text", "text": {"content": " "}},
+        {"type": "text", "text": {"content": "it"}, "annotations": {"italic": True}},
+    ]
+
+
+def test_inline_nested_and_plain_markers():
+    assert parse_inline("**very _bold_**") == [
+        {"type": "text", "text": {"content": "very "}, "annotations": {"bold": True}},
+        {"type": "text", "text": {"content": "bold"}, "annotations": {"bold": True, "italic": True}},
+    ]
+    # so'z ichidagi _ va * formatlash emas
+    assert parse_inline("snake_case_name 2*3*4") == [
+        {"type": "text", "text": {"content": "snake_case_name 2*3*4"}}
+    ]
+
+
+def test_nesting_is_clamped():
+    (root,) = compile_markup("- a\n  - b\n    - c\n      - d")
+    (second,) = children(root)
+    assert [text(block) for block in children(second)] == ["c", "d"]
+    assert all(not children(block) for block in children(second))
+    assert MAX_NESTING_DEPTH == 2
+
+
+def test_children_of_heading_become_siblings():
+    heading, item = compile_markup("# Title\n  - item")
+    assert heading["type"] == "heading_1"
+    assert "children" not in heading["heading_1"]
+    assert text(item) == "item"
+
+
+def test_children_cap_moves_overflow_to_siblings():
+    count = MAX_BLOCKS_PER_REQUEST + 3
+    markup = "+ Answers\n" + "".join(f"  - item {number}\n" for number in range(count))
+    toggle, *rest = compile_markup(markup)
+    assert len(children(toggle)) == MAX_BLOCKS_PER_REQUEST
+    assert [text(block) for block in rest] == [f"item {number}" for number in range(MAX_BLOCKS_PER_REQUEST, count)]
+
+
+def test_long_rich_text_is_split():
+    long_text = "word " * 1000
+    (block,) = compile_markup(f"> {long_text}")
+    rich_text = block["quote"]["rich_text"]
+    assert len(rich_text) == 3
+    assert all(len(item["text"]["content"]) <= MAX_RICH_TEXT_LENGTH for item in rich_text)
+    assert text(block) == long_text.strip()
+
+
+def test_long_code_block_is_split():
+    code = "x" * (MAX_RICH_TEXT_LENGTH + 1)
+    (block,) = compile_markup(f"```\n{code}\n```")
+    assert [len(item["text"]["content"]) for item in block["code"]["rich_text"]] == [MAX_RICH_TEXT_LENGTH, 1]
+
+
+def test_lesson_structure():
+    blocks = compile_markup(LESSON)
+    assert [block["type"] for block in blocks] == [
+        "heading_1",
+        "paragraph",
+        "paragraph",
+        "heading_2",
+        "bulleted_list_item",
+        "numbered_list_item",
+        "numbered_list_item",
+        "to_do",
+        "to_do",
+        "quote",
+        "callout",
+        "callout",
+        "toggle",
+        "divider",
+        "code",
+        "heading_3",
+    ]
+    assert [text(block) for block in children(blocks[12])] == ["works", "goes"]
+
+
+@pytest.mark.parametrize("size", [1, 5, 17])
+def test_streaming_matches_compile(size):
+    parser = MarkupParser()
+    blocks = []
+    for start in range(0, len(LESSON), size):
+        blocks.extend(parser.feed(LESSON[start : start + size]))
+    blocks.extend(parser.close())
+    assert blocks == compile_markup(LESSON)
+
+
+def test_feed_returns_only_finished_blocks():
+    parser = MarkupParser()
+    assert parser.feed("# Title\n- one\n") == [compile_markup("# Title")[0]]
+    # ichki qator hali shu blokka tegishli bo'lishi mumkin
+    assert parser.feed("  - two\n") == []
+    (item,) = parser.close()
+    assert [text(block) for block in children(item)] == ["two"]
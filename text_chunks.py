@@ -0,0 +1,66 @@
+import re
+
+# Ingliz matni uchun taxminan 4 ta belgi = 1 token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate, good enough for sizing prompts
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_long_text(text: str, max_tokens: int) -> list:
+    """
+    Split text that is too long for one chunk on paragraph, then line boundaries
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    parts = []
+    current = ""
+    for piece in re.split(r"(?<=\n)", text):
+        if estimate_tokens(piece) > max_tokens:
+            # Yangi qatorsiz juda uzun bo'lak: belgilar bo'yicha bo'lish
+            step = max_tokens * CHARS_PER_TOKEN
+            pieces = [piece[i : i + step] for i in range(0, len(piece), step)]
+        else:
+            pieces = [piece]
+
+        for piece in pieces:
+            if current and estimate_tokens(current + piece) > max_tokens:
+                parts.append(current)
+                current = ""
+            current += piece
+
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_page_texts(page_texts, max_tokens: int):
+    """
+    Group consecutive pages into chunks of at most max_tokens.
+    Pages are never cut unless a single page is longer than max_tokens.
+
+    Args:
+        page_texts (Iterable[tuple]): (page_number, text) pairs in page order
+        max_tokens (int): Token budget of one chunk
+
+    Yields:
+        str: Chunk text, as soon as it is full
+    """
+    current = []
+    current_tokens = 0
+    for _, text in page_texts:
+        for part in split_long_text(text, max_tokens):
+            tokens = estimate_tokens(part)
+            if current and current_tokens + tokens > max_tokens:
+                yield "\n\n".join(current)
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += tokens
+
+    if current:
+        yield "\n\n".join(current)